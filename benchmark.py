@@ -0,0 +1,736 @@
+"""
+Benchmarks for the feature flag sync pipeline.
+
+Runs against synthetic data, so no GitLab or Confluence access is needed.
+
+Usage:
+    python benchmark.py parse [--rows 5000]
+    python benchmark.py merge [--sizes 1000 10000 100000] [--legacy-max 10000]
+    python benchmark.py render [--sizes 1000 5000 20000] [--shapes 20]
+    python benchmark.py teams [--flags 10000] [--teams 500]
+    python benchmark.py model [--flags 50000] [--environments 5] [--shapes 50]
+    python benchmark.py processes [--sizes 10000 100000] [--processes 4] [--shapes 50]
+    python benchmark.py drift [--sizes 10000 100000] [--environments 3] [--shapes 50]
+    python benchmark.py size [--sizes 1000 10000] [--shapes 50]
+    python benchmark.py pipeline [--projects 3] [--sizes 100 1000 5000] [--output benchmark_results.json]
+                                 [--record DIR | --replay DIR] [--baseline FILE] [--tolerance 0.25]
+    python benchmark.py startup [--projects 3] [--flags 1000] [--repeat 5]
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import main
+import stub_server
+
+ENVIRONMENTS = ["prod", "qa", "uat"]
+
+
+def make_details(rng):
+    """
+    Builds a random details dictionary shaped like the ones produced by merge_feature_flags().
+    """
+    strategies = [
+        {
+            "id": rng.randint(1, 10**6),
+            "name": rng.choice(["default", "userWithId", "gradualRolloutUserId"]),
+            "parameters": {"userIds": ",".join(str(rng.randint(1, 10**5)) for _ in range(rng.randint(1, 5)))},
+            "scopes": [{"id": rng.randint(1, 10**6), "environment_scope": rng.choice(["*", "production", "review/*"])}],
+        }
+        for _ in range(rng.randint(1, 3))
+    ]
+    return {"scopes": [], "strategies": strategies, "user_list": None}
+
+
+def with_new_ids(strategies, rng):
+    """
+    Copies strategies with new strategy and scope IDs, as GitLab numbers them per flag and project.
+    """
+    return [
+        dict(strategy, id=rng.randint(1, 10**9),
+             scopes=[dict(scope, id=rng.randint(1, 10**9)) for scope in strategy["scopes"]])
+        for strategy in strategies
+    ]
+
+
+def make_table(rows, seed=0, shapes=None):
+    """
+    Builds a synthetic merged feature flag table.
+
+    Args:
+        rows (int): The number of feature flags.
+        seed (int): The random seed.
+        shapes (int, optional): If set, details are drawn from this many distinct shapes
+            instead of being unique per cell. Every cell still gets its own IDs.
+
+    Returns:
+        pd.DataFrame: The table in the format returned by merge_feature_flags().
+    """
+    rng = random.Random(seed)
+    pool = [make_details(rng) for _ in range(shapes)] if shapes else None
+    records = []
+    for index in range(rows):
+        record = {
+            "Feature toggle name": f"flag_{index}",
+            "Feature description": f"Synthetic flag number {index}",
+            "Owned by": f"Developer {index % 50}",
+            "Status": rng.choice(["In Use 🟢", "Inactive ⚪"]),
+        }
+        for environment in ENVIRONMENTS:
+            if pool:
+                shape = rng.choice(pool)
+                details = dict(shape, strategies=with_new_ids(shape["strategies"], rng))
+            else:
+                details = make_details(rng)
+            record[environment] = main.get_environment_state(rng.choice(["Enabled", "Disabled"]), details)
+        records.append(record)
+    return pd.DataFrame(records)
+
+
+def measure(function, *args):
+    """
+    Measures the wall time and peak traced memory of a function.
+
+    The function runs twice: once untraced for the timing, since tracemalloc slows down
+    pure-Python code far more than C extensions, and once under tracemalloc for the peak.
+
+    Returns:
+        tuple: The result, the elapsed seconds and the peak memory in MiB.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def report(label, elapsed, peak):
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms {peak:10.1f} MiB")
+
+
+def bench_parse(args):
+    """
+    Compares pd.read_html with parse_feature_flag_table() on a synthetic page.
+    """
+    table = make_table(args.rows)
+    main.start_log_run()
+    for index in range(main.LOG_BUFFER_SIZE):
+        main.add_to_log(f"Synthetic log message {index}")
+    page = main.add_link() + main.generate_html_with_icons_and_dropdown(table) + main.generate_log_html()
+    print(f"Page body: {len(page) / 2**20:.1f} MiB, {args.rows} rows")
+
+    _, elapsed, peak = measure(lambda: pd.read_html(io.StringIO(page))[0])
+    report("pd.read_html", elapsed, peak)
+    parsed, elapsed, peak = measure(main.parse_feature_flag_table, page)
+    report("parse_feature_flag_table", elapsed, peak)
+    assert len(parsed) == args.rows
+
+
+def legacy_append_deleted_flags(existing_table, new_table):
+    """
+    The per-row iterrows + concat loop that append_deleted_flags() replaced, kept for comparison.
+    """
+    for _, row in existing_table.iterrows():
+        flag_name = row["Feature toggle name"]
+        if flag_name not in new_table["Feature toggle name"].values:
+            row["Status"] = "Deleted 🔴"
+            for repo_url, _ in main.REPOSITORY_MAP:
+                if repo_url not in row:
+                    row[repo_url] = "Deleted"
+            new_table = pd.concat([new_table, pd.DataFrame([row])], ignore_index=True)
+    return new_table
+
+
+def bench_merge(args):
+    """
+    Compares the legacy deleted-flag loop with append_deleted_flags() followed by update_table().
+
+    Every tenth flag of the existing table is missing from the new table, so it is marked deleted.
+    """
+    for size in args.sizes:
+        existing_table = make_table(size)
+        new_table = existing_table[existing_table.index % 10 != 0].reset_index(drop=True)
+        print(f"{size} flags, {size - len(new_table)} deleted")
+
+        def run(append):
+            merged = append(existing_table.copy(), new_table.copy())
+            return main.update_table(existing_table.copy(), merged)
+
+        if size <= args.legacy_max:
+            _, elapsed, peak = measure(run, legacy_append_deleted_flags)
+            report("  iterrows + concat per row", elapsed, peak)
+        result, elapsed, peak = measure(run, main.append_deleted_flags)
+        report("  append_deleted_flags", elapsed, peak)
+        assert len(result) == size
+
+
+def legacy_format_details(details):
+    """
+    The string-concatenating format_details() that the chunked version replaced, kept for comparison.
+    """
+    def json_to_html(data, level=0):
+        html = ""
+        indent = "&nbsp;" * (level * 4)
+        if isinstance(data, dict):
+            for key, value in data.items():
+                html += f"{indent}<strong>{key}:</strong> {json_to_html(value, level + 1)}<br>"
+        elif isinstance(data, list):
+            for item in data:
+                html += f"{indent}- {json_to_html(item, level + 1)}<br>"
+        else:
+            html += f"{indent}{str(data)}"
+        return html
+
+    return json_to_html(details)
+
+
+def legacy_generate_html(table):
+    """
+    The copy-and-map generate_html_with_icons_and_dropdown() that the streaming renderer replaced,
+    kept for comparison. The <style> block is left out as it is identical in both.
+    """
+    def format_cell(cell):
+        if isinstance(cell, main.EnvironmentState):  # The legacy code read plain dictionaries
+            cell = {"status": cell.status, "details": cell.details}
+        if not isinstance(cell, dict):
+            return f'{main.STATUS_ICONS["Not Available"]}'
+        icon = main.STATUS_ICONS.get(cell.get("status", "Not Available"), main.STATUS_ICONS["Not Available"])
+        if main.should_show_dropdown(cell.get("details", {})):
+            dropdown = (
+                f'<ac:structured-macro ac:name="expand" ac:schema-version="1">'
+                f'<ac:parameter ac:name="title" style="max-width: 200px;">Show scope</ac:parameter>'
+                f'<ac:rich-text-body>'
+                f'<pre style="max-width: 200px; overflow: scroll; font-family: monospace; white-space: pre-wrap; word-wrap: break-word; background: #f9f9f9; padding: 10px; border-radius: 4px; border: 1px solid #ddd;">'
+                f'{legacy_format_details(cell.get("details", {}))}'
+                f'</pre>'
+                f'</ac:rich-text-body>'
+                f'</ac:structured-macro>'
+            )
+            return icon + dropdown
+        return f'{icon}'
+
+    table = table.copy()
+    for column in table.columns:
+        if column not in main.BASE_COLUMNS:
+            table[column] = table[column].map(format_cell)
+
+    return f"""
+    <table style="width: 100%; border-collapse: collapse; font-size: 14px; font-family: Arial, sans-serif;">
+        <thead>
+            <tr>
+                {''.join(f'<th style="border: 1px solid #ddd; padding: 10px; background-color: #f4f4f4;">{col}</th>' for col in table.columns)}
+            </tr>
+        </thead>
+        <tbody>
+            {''.join(
+                '<tr>' +
+                ''.join(f'<td style="border: 1px solid #ddd; padding: 10px; text-align: left; vertical-align: top;">{cell}</td>' for column, cell in zip(table.columns, row)) +
+                '</tr>'
+                for row in table.values
+            )}
+        </tbody>
+    </table>
+    """
+
+
+def bench_render(args):
+    """
+    Compares the legacy HTML generation with generate_html_with_icons_and_dropdown().
+    """
+    for size in args.sizes:
+        table = make_table(size, shapes=args.shapes)
+        print(f"{size} flags")
+        _, elapsed, peak = measure(legacy_generate_html, table)
+        report("  copy + map + nested joins", elapsed, peak)
+        def render(table):
+            main.details_cache.clear()
+            return main.generate_html_with_icons_and_dropdown(table)
+
+        html, elapsed, peak = measure(render, table)
+        report("  generate_html_with_icons_and_dropdown", elapsed, peak)
+        print(f"  {main.global_log[-1][1]}")
+        print(f"  body: {len(html) / 2**20:.1f} MiB")
+
+
+def legacy_get_team_from_flag_name(flag_name, teams):
+    """
+    The per-call tokenize-and-scan team lookup that the team index replaced, kept for comparison.
+    """
+    words = re.findall(r'\w+', flag_name.lower())
+    for team in teams:
+        if team.lower() in words:
+            return team
+    return None
+
+
+def bench_teams(args):
+    """
+    Compares the legacy team lookup with get_team_from_flag_name() for every flag in every environment.
+    """
+    rng = random.Random(0)
+    teams = [f"Team{index}" for index in range(args.teams)]
+    flag_names = [
+        f"{rng.choice(['enable', 'use', 'show'])}_{rng.choice(teams).lower() if rng.random() < 0.7 else 'misc'}_feature_{index}"
+        for index in range(args.flags)
+    ]
+    lookups = flag_names * len(ENVIRONMENTS)
+    print(f"{args.flags} flags x {len(ENVIRONMENTS)} environments, {args.teams} teams")
+
+    expected, elapsed, peak = measure(lambda: [legacy_get_team_from_flag_name(name, teams) for name in lookups])
+    report("  tokenize + scan TEAMS", elapsed, peak)
+
+    main.TEAMS = teams
+
+    def resolve():
+        main.reset_team_index()
+        return [main.get_team_from_flag_name(name) for name in lookups]
+
+    result, elapsed, peak = measure(resolve)
+    report("  get_team_from_flag_name", elapsed, peak)
+    assert result == expected
+
+
+def make_gitlab_flags(flags, environments, shapes, seed=0):
+    """
+    Builds synthetic GitLab API responses for a number of environments.
+
+    Args:
+        flags (int): The number of feature flags per environment.
+        environments (list): The repository IDs, one per environment.
+        shapes (int): The number of distinct strategy lists the flags are drawn from, each
+            flag with its own strategy and scope IDs.
+        seed (int): The random seed.
+
+    Returns:
+        dict: The flags per repository ID, as returned by fetch_feature_flags_for_repositories().
+    """
+    rng = random.Random(seed)
+    pool = [make_details(rng)["strategies"] for _ in range(shapes)]
+    return {
+        repo_id: [
+            {
+                "name": f"flag_{index}",
+                "description": f"Synthetic flag number {index}",
+                "active": rng.random() < 0.5,
+                "created_by": {"name": f"Developer {index % 50}"},
+                "scopes": [],
+                "strategies": [dict(strategy, user_list=None) for strategy in with_new_ids(rng.choice(pool), rng)],
+            }
+            for index in range(flags)
+        ]
+        for repo_id in environments
+    }
+
+
+def legacy_build_environment_cell(flag):
+    """
+    The build_environment_cell() that copied details into a new dictionary per cell, kept for comparison.
+    """
+    strategies = flag.get("strategies", [])
+    return {
+        "status": "Enabled" if flag["active"] else "Disabled",
+        "details": {
+            "scopes": flag.get("scopes", []),
+            "strategies": [
+                {"id": strategy["id"], "name": strategy["name"], "parameters": strategy["parameters"],
+                 "scopes": strategy.get("scopes", [])}
+                for strategy in strategies
+            ],
+            "user_list": strategies[0].get("user_list") if strategies else None,
+        },
+    }
+
+
+def legacy_merge_feature_flags(flags_by_repo):
+    """
+    The dictionary-per-flag merge_feature_flags() that the column-wise version replaced, kept for comparison.
+    """
+    all_flags = {}
+    for repo_url, repo_id in main.REPOSITORY_MAP:
+        for flag in flags_by_repo[repo_id]:
+            flag_name = flag["name"]
+            if flag_name not in all_flags:
+                all_flags[flag_name] = {
+                    "Feature toggle name": flag_name,
+                    "Feature description": flag.get("description", ""),
+                    "Owned by": main.format_owned_by(flag),
+                    "Status": set(),
+                }
+            all_flags[flag_name][repo_url] = legacy_build_environment_cell(flag)
+            all_flags[flag_name]["Status"].add("Active" if flag["active"] else "Inactive")
+
+    expanded_data = []
+    for flag_data in all_flags.values():
+        row = dict(flag_data)
+        row["Status"] = "In Use 🟢" if "Active" in flag_data["Status"] else "Inactive ⚪"
+        expanded_data.append(row)
+    return pd.DataFrame(expanded_data)
+
+
+def bench_model(args):
+    """
+    Compares the peak memory of merging into a table of legacy dictionary cells and into a
+    table of shared EnvironmentState cells.
+    """
+    environments = [f"env{index}" for index in range(args.environments)]
+    flags_by_repo = make_gitlab_flags(args.flags, environments, args.shapes)
+    main.REPOSITORY_MAP = [(environment, environment) for environment in environments]
+    main.fetch_feature_flags_for_repositories = lambda repo_ids: flags_by_repo
+    print(f"{args.flags} flags x {args.environments} environments, {args.shapes} strategy shapes")
+
+    _, elapsed, peak = measure(legacy_merge_feature_flags, flags_by_repo)
+    report("  dictionary cells", elapsed, peak)
+
+    def merge():
+        main.reset_interned_states()
+        return main.merge_feature_flags()
+
+    table, elapsed, peak = measure(merge)
+    report("  EnvironmentState cells", elapsed, peak)
+    print(f"  {len(main.environment_states)} distinct cell states, {len(main.interned_values)} interned values")
+    assert len(table) == args.flags
+
+
+def bench_processes(args):
+    """
+    Compares serial rendering with rendering in RENDER_PROCESSES worker processes.
+
+    The pool is started before timing, as it lives for the whole process in the app.
+    """
+    main.RENDER_PROCESSES = args.processes
+    main.RENDER_PROCESSES_MIN_ROWS = 0
+    warm_up = make_table(1)
+    columns, rows = list(warm_up.columns), list(warm_up.itertuples(index=False, name=None))
+    list(main.get_render_pool().map(main.render_rows_partition, [columns] * args.processes, [rows] * args.processes))
+
+    for size in args.sizes:
+        table = make_table(size, shapes=args.shapes or None)
+        print(f"{size} flags, {args.processes} processes, {os.cpu_count()} CPUs")
+
+        def render(processes):
+            main.RENDER_PROCESSES = processes
+            main.details_cache.clear()
+            return main.generate_html_with_icons_and_dropdown(table)
+
+        serial, serial_elapsed, peak = measure(render, 0)
+        report("  serial", serial_elapsed, peak)
+        start = time.perf_counter()
+        parallel = render(args.processes)
+        elapsed = time.perf_counter() - start
+        print(f"  {'processes':<38} {elapsed * 1000:10.1f} ms {serial_elapsed / elapsed:9.2f}x")
+        assert parallel == serial
+
+
+def bench_drift(args):
+    """
+    Times the environment drift report, with an empty and with a filled signature cache.
+    """
+    environments = [f"env{index}" for index in range(args.environments)]
+    main.REPOSITORY_MAP = [(environment, environment) for environment in environments]
+    for size in args.sizes:
+        flags_by_repo = make_gitlab_flags(size, environments, args.shapes)
+        main.fetch_feature_flags_for_repositories = lambda repo_ids: flags_by_repo
+        main.reset_interned_states()
+        table = main.merge_feature_flags()
+        print(f"{size} flags x {args.environments} environments, {args.shapes} strategy shapes")
+
+        def build(clear):
+            if clear:
+                main.environment_signatures.clear()
+            return main.build_drift_report(table)
+
+        report_result, elapsed, peak = measure(build, True)
+        report("  cold signature cache", elapsed, peak)
+        _, elapsed, peak = measure(build, False)
+        report("  warm signature cache", elapsed, peak)
+        print("  " + ", ".join(f"{len(entries)} {kind}" for kind, entries in report_result["drift"].items()))
+
+
+def bench_size(args):
+    """
+    Compares the page body size of the "inline" and "compact" PAGE_FORMAT, with a full run
+    log of LOG_BUFFER_SIZE messages on the page and moved to an attachment.
+    """
+    main.start_log_run()
+    main.global_log.extend((logging.INFO, f"Fetched page {page} of feature flags for repository 'env1'.")
+                           for page in range(main.LOG_BUFFER_SIZE))
+    main.log_level_counts[logging.INFO] += main.LOG_BUFFER_SIZE
+    for size in args.sizes:
+        table = make_table(size, shapes=args.shapes or None)
+        print(f"{size} flags")
+        for page_format in ["inline", "compact"]:
+            for target in ["page", "attachment"]:
+                main.PAGE_FORMAT, main.RUN_LOG_TARGET = page_format, target
+                main.details_cache.clear()
+                start = time.perf_counter()
+                body = main.render_single_page(table, {})
+                elapsed = time.perf_counter() - start
+                label = f"  {page_format}, run log on {target}"
+                print(f"{label:<40} {elapsed * 1000:10.1f} ms {len(body.encode('utf-8')) / 2**20:10.2f} MiB")
+
+
+PIPELINE_RUNS = [
+    ("cold", "full"),  # Empty store, cache and snapshot: fetch everything and create the page
+    ("warm", "full"),  # Nothing changed: conditional GitLab requests and no upload
+    ("republish", "publish"),  # Snapshot removed: render the whole page from the store and upload it
+]
+
+
+def pipeline_settings(base_url, projects, workdir):
+    """
+    Returns the main.py settings that point the sync at a stub server (or a replayed
+    recording of one) with local state in workdir.
+    """
+    return {
+        "GITLAB_API_URL": f"{base_url}/api/v4",
+        "GITLAB_TOKEN": "stub-token",
+        "CONFLUENCE_API_URL": base_url,
+        "SPACE_KEY": "BENCH",
+        "EMAIL": "bench@example.com",
+        "CONFLUENCE_API_TOKEN": "stub-token",
+        "REPOSITORY_MAP": [(f"env{project}", str(project)) for project in range(1, projects + 1)],
+        "GITLAB_CACHE_DIR": os.path.join(workdir, "gitlab_cache"),
+        "SNAPSHOT_PATH": os.path.join(workdir, "snapshot.json"),
+        "FLAG_STORE_PATH": os.path.join(workdir, "feature_flags.db"),
+        "LOG_FILE": os.path.join(workdir, "script.log"),
+        # The stub is local, so request pacing would only measure the rate limit
+        "HTTP_RATE_LIMIT": 10**9,
+        "HTTP_RATE_BURST": 10**9,
+    }
+
+
+def configure_pipeline(base_url, projects, workdir):
+    """
+    Points the sync at a stub server (or a replayed recording of one) with local state in workdir.
+    """
+    for name, value in pipeline_settings(base_url, projects, workdir).items():
+        setattr(main, name, value)
+    main.gitlab_session = main.confluence_client = None
+    main.confluence_pages.clear()
+    main.details_cache.clear()
+
+
+def run_pipeline(flags, args):
+    """
+    Runs PIPELINE_RUNS against one scale and returns a result per run.
+    """
+    server = None
+    if args.replay:
+        main.FIXTURE_MODE, main.FIXTURE_DIR = "replay", os.path.join(args.replay, str(flags))
+        base_url = "http://replay.invalid"
+    else:
+        if args.record:
+            main.FIXTURE_MODE, main.FIXTURE_DIR = "record", os.path.join(args.record, str(flags))
+        server, base_url = stub_server.start_stub_server(args.projects, flags)
+    main.fixture_counts.clear()
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure_pipeline(base_url, args.projects, workdir)
+            for run, mode in PIPELINE_RUNS:
+                if run == "republish":
+                    os.remove(main.SNAPSHOT_PATH)
+                main.stage_durations.clear()
+                start = time.perf_counter()
+                summary = main.run_sync(mode)
+                elapsed = time.perf_counter() - start
+                stages = {
+                    stage if project is None else f"{stage}[{project}]": seconds
+                    for (stage, project), seconds in main.stage_durations.items()
+                }
+                results.append({"flags_per_project": flags, "run": run, "seconds": elapsed, "stages": stages, "result": summary})
+                uploaded = sum(size["after"] for size in summary.get("page_bytes", {}).values())
+                print(f"  {run:<10} {elapsed * 1000:10.1f} ms  {summary['result']:<10} {uploaded / 2**20:8.2f} MiB uploaded")
+    finally:
+        if server is not None:
+            server.shutdown()
+    return results
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """
+    Compares run times with an earlier results file.
+
+    Returns:
+        list: A description of every run that got slower by more than the tolerance.
+    """
+    with open(baseline_path) as baseline_file:
+        baseline = {(result["flags_per_project"], result["run"]): result for result in json.load(baseline_file)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["flags_per_project"], result["run"]))
+        if previous and result["seconds"] > previous["seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{result['run']} at {result['flags_per_project']} flags: "
+                f"{previous['seconds']:.3f}s -> {result['seconds']:.3f}s"
+            )
+    return regressions
+
+
+def bench_pipeline(args):
+    """
+    Times the full sync and each of its stages against the stub server at several scales.
+
+    Results are written as JSON to --output. With --baseline, runs that are slower than the
+    baseline by more than --tolerance are listed and the exit status is 1.
+    """
+    results = []
+    for flags in args.sizes:
+        print(f"{args.projects} projects x {flags} flags")
+        results.extend(run_pipeline(flags, args))
+
+    with open(args.output, "w") as output_file:
+        json.dump({
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "projects": args.projects,
+            "source": "replay" if args.replay else "stub",
+            "results": results,
+        }, output_file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+STARTUP_MODULES = ["pandas", "atlassian", "flask", "flask_cors"]
+
+# Run in a fresh interpreter per measurement: argv[1] is the mode, argv[2] the settings as JSON
+STARTUP_SCRIPT = """
+import json, sys
+import main
+if sys.argv[1] == "serve":
+    main.get_app()
+elif sys.argv[1] == "cli":
+    main.__dict__.update(json.loads(sys.argv[2]))
+    main.main_cli(["sync", "--dry-run", "--output", sys.argv[3]])
+print(json.dumps([module for module in %r if module in sys.modules]), file=sys.stderr)
+""" % STARTUP_MODULES
+
+
+def bench_startup(args):
+    """
+    Times cold starts in fresh interpreters: importing main.py, creating the Flask app
+    ("serve"), and a complete `main.py sync --dry-run --output` against the stub server ("cli").
+    """
+    server, base_url = stub_server.start_stub_server(args.projects, args.flags)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            settings = json.dumps(pipeline_settings(base_url, args.projects, workdir))
+            output = os.path.join(workdir, "feature_flags.html")
+            print(f"{args.projects} projects x {args.flags} flags, median of {args.repeat} runs")
+            for mode in ["import", "serve", "cli"]:
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    process = subprocess.run(
+                        [sys.executable, "-c", STARTUP_SCRIPT, mode, settings, output],
+                        cwd=os.path.dirname(os.path.abspath(main.__file__)),
+                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+                    )
+                    timings.append(time.perf_counter() - start)
+                loaded = json.loads(process.stderr.strip().splitlines()[-1])
+                print(f"  {mode:<38} {statistics.median(timings) * 1000:10.1f} ms   loads {', '.join(loaded) or 'none'}")
+    finally:
+        server.shutdown()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parse_parser = subparsers.add_parser("parse", help="Parse the existing Confluence table.")
+    parse_parser.add_argument("--rows", type=int, default=5000)
+    parse_parser.set_defaults(func=bench_parse)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the existing and new tables.")
+    merge_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    merge_parser.add_argument("--legacy-max", type=int, default=10000,
+                              help="Largest size to run the quadratic legacy loop on.")
+    merge_parser.set_defaults(func=bench_merge)
+
+    render_parser = subparsers.add_parser("render", help="Render the Confluence table HTML.")
+    render_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    render_parser.add_argument("--shapes", type=int, default=None,
+                               help="Number of distinct detail shapes (default: unique per cell).")
+    render_parser.set_defaults(func=bench_render)
+
+    teams_parser = subparsers.add_parser("teams", help="Resolve teams from flag names.")
+    teams_parser.add_argument("--flags", type=int, default=10000)
+    teams_parser.add_argument("--teams", type=int, default=500)
+    teams_parser.set_defaults(func=bench_teams)
+
+    model_parser = subparsers.add_parser("model", help="Merge and render GitLab flags into the table model.")
+    model_parser.add_argument("--flags", type=int, default=50000)
+    model_parser.add_argument("--environments", type=int, default=5)
+    model_parser.add_argument("--shapes", type=int, default=50,
+                              help="Number of distinct strategy lists the flags are drawn from.")
+    model_parser.set_defaults(func=bench_model)
+
+    processes_parser = subparsers.add_parser("processes", help="Render rows in worker processes.")
+    processes_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    processes_parser.add_argument("--processes", type=int, default=4)
+    processes_parser.add_argument("--shapes", type=int, default=50,
+                                  help="Number of distinct detail shapes, 0 for unique details per cell.")
+    processes_parser.set_defaults(func=bench_processes)
+
+    drift_parser = subparsers.add_parser("drift", help="Build the environment drift report.")
+    drift_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    drift_parser.add_argument("--environments", type=int, default=3)
+    drift_parser.add_argument("--shapes", type=int, default=50,
+                              help="Number of distinct strategy lists the flags are drawn from.")
+    drift_parser.set_defaults(func=bench_drift)
+
+    size_parser = subparsers.add_parser("size", help="Compare page body sizes per page format.")
+    size_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    size_parser.add_argument("--shapes", type=int, default=50,
+                             help="Number of distinct detail shapes, 0 for unique details per cell.")
+    size_parser.set_defaults(func=bench_size)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Run the full sync against the stub server.")
+    pipeline_parser.add_argument("--projects", type=int, default=3)
+    pipeline_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000],
+                                 help="Feature flags per project.")
+    pipeline_parser.add_argument("--output", default="benchmark_results.json")
+    fixtures = pipeline_parser.add_mutually_exclusive_group()
+    fixtures.add_argument("--record", metavar="DIR", help="Record the stub responses as fixtures.")
+    fixtures.add_argument("--replay", metavar="DIR", help="Replay recorded fixtures instead of using the stub.")
+    pipeline_parser.add_argument("--baseline", metavar="FILE", help="Earlier results to compare with.")
+    pipeline_parser.add_argument("--tolerance", type=float, default=0.25,
+                                 help="Allowed slowdown against the baseline, as a fraction.")
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    startup_parser = subparsers.add_parser("startup", help="Time cold starts of the app and the sync CLI.")
+    startup_parser.add_argument("--projects", type=int, default=3)
+    startup_parser.add_argument("--flags", type=int, default=1000, help="Feature flags per project.")
+    startup_parser.add_argument("--repeat", type=int, default=5)
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,13 +1,30 @@
+# pandas (through _pd()), atlassian and flask are imported on first use, so the sync
+# CLI starts without flask and the app starts without pandas and atlassian
 import requests
-import pandas as pd
-from atlassian import Confluence
-import io
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+import argparse
+import os
+import sys
 import re
-from flask import Flask, jsonify, redirect
-from flask_cors import CORS
-
-app = Flask(__name__)
-CORS(app, resources={r"/update_feature_flags": {"origins": "https://.atlassian.net"}})
+import json
+import hashlib
+import sqlite3
+from contextlib import closing
+import time
+import threading
+import uuid
+import hmac
+from urllib.parse import quote, urlsplit
+from contextlib import contextmanager
+import logging
+from logging.handlers import MemoryHandler, RotatingFileHandler
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+import zlib
+import html
 
 
 # Configuration
@@ -18,14 +35,122 @@ PROJECT_ID_PROD = ""
 REPOSITORY_IDS = []  # Replace with your repo names
 GITLAB_API_URL = "https://gitlab.com/api/v4"
 CONFLUENCE_API_URL =  "https://.atlassian.net/wiki"
-PAGE_ID =   # ID Confluence page
-BASE_URL = "https://.atlassian.net/wiki"
+PAGE_ID = None  # ID of the Confluence page, None to look it up by PAGE_TITLE
+BASE_URL = "https://.atlassian.net/wiki"  # Browser URL of Confluence, browsers that trigger a sync are sent back to the page there
 SPACE_KEY = ""
 CONFLUENCE_API_TOKEN = ""
 EMAIL = ''
 PAGE_TITLE = "Feature Flags"
 TEAMS = ["Name"] # Replace with your Teams names
-global_log = []
+TEAM_ALIASES = {}  # Extra flag name words per team, e.g. {"Payments": ["pay", "billing"]}
+TEAM_PREFIXES = {}  # Flag name prefixes per team, e.g. {"Payments": ["pmt_"]}, used when no word matches
+GITLAB_MAX_WORKERS = 8  # Max concurrent requests to the GitLab API
+GITLAB_PER_PAGE = 100
+GITLAB_TIMEOUT = 30  # Seconds
+HTTP_MAX_RETRIES = 5  # Retries of failed GitLab and Confluence requests
+HTTP_BACKOFF_FACTOR = 0.5  # Seconds before the first retry, doubled on every further retry
+HTTP_BACKOFF_MAX = 60  # Seconds
+HTTP_BACKOFF_JITTER = 0.5  # Max random seconds added to each backoff
+HTTP_RATE_LIMIT = 10  # Requests per second per host
+HTTP_RATE_BURST = 20  # Requests per host that may be sent at once before HTTP_RATE_LIMIT applies
+FIXTURE_MODE = None  # "record" saves GitLab and Confluence responses to FIXTURE_DIR, "replay" serves them from it offline
+FIXTURE_DIR = "fixtures"
+CONFLUENCE_MAX_CONNECTIONS = 4  # Connections kept alive by the shared Confluence client
+GITLAB_CACHE_DIR = ".gitlab_cache"  # Set to None to disable conditional-request caching
+SNAPSHOT_PATH = "published_snapshot.json"  # Last published table state, set to None to always publish
+USER_IDS_PREVIEW = 10  # User IDs shown per strategy on the page, the rest is summarized as "N more"
+USER_LIST_CACHE_SECONDS = 300  # How long user lists fetched on demand are reused
+RENDER_PROCESSES = 0  # Worker processes rendering table rows, 0 renders in the sync thread (1 is rejected)
+RENDER_PROCESSES_MIN_ROWS = 2000  # Fewer rows to render than this are rendered in the sync thread
+RENDER_CONFIG = ("PAGE_FORMAT", "USER_IDS_PREVIEW", "DETAILS_CACHE_SIZE")  # Settings render workers copy from the app
+DETAILS_CACHE_SIZE = 4096  # Max distinct rendered detail dropdowns kept in memory
+LOG_FILE = "script.log"
+LOG_LEVEL = logging.INFO  # Set to logging.DEBUG to include per-page and per-cell messages
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Rotate the log file at this size
+LOG_BACKUP_COUNT = 3
+LOG_FLUSH_CAPACITY = 200  # Messages buffered before they are written to the log file
+LOG_BUFFER_SIZE = 500  # Max messages kept per run for the log block on the Confluence page
+LOG_HTML_SUMMARY_ONLY = False  # Show only counts, warnings and errors in the Confluence log block
+SYNC_JOB_HISTORY = 100  # Finished sync jobs kept for the status endpoint
+FLAG_STORE_PATH = "feature_flags.db"  # Local SQLite flag store, set to None to read the table back from Confluence
+GITLAB_WEBHOOK_SECRET = ""  # Secret token configured on the GitLab webhook
+WEBHOOK_DEBOUNCE_SECONDS = 30  # Quiet period after the last webhook before the page is republished
+PUBLISH_MODE = "single"  # "single" page, or "sharded" into child pages below an index page
+SHARD_BY = "team"  # Shard child pages by "team" or by flag name "prefix"
+SHARD_PREFIX_SEPARATOR = "_"
+DRIFT_REPORT_ON_PAGE = False  # Add the environment drift report below the table (on the index page when sharded)
+DRIFT_REPORT_MAX_FLAGS = 50  # Flags listed per drift kind on the page, the rest is summarized as "N more"
+PAGE_FORMAT = "inline"  # "inline" styles every cell, "compact" styles the table through shared classes only
+RUN_LOG_TARGET = "page"  # Publish the run log on the "page", as an "attachment" of it, or on a "child" page
+RUN_LOG_ATTACHMENT = "feature_flags_run_log.txt"
+PAGE_SIZE_BUDGET = None  # Max bytes of a page body, e.g. 2 * 1024 * 1024; a sync that exceeds it fails before uploading
+BASE_COLUMNS = ["Feature toggle name", "Feature description", "Owned by", "Status"]
+DRIFT_KINDS = {
+    "missing": "Not in every environment",
+    "enabled": "Enabled in some environments only",
+    "strategy": "Strategies differ between environments",
+}
+STATUS_ICON_CHARS = {
+    "\u2714": "Enabled",
+    "\u2716": "Disabled",
+    "\u25CB": "Not Available",
+    "\U0001F5D1": "Deleted",
+}
+DETAILS_ID_KEYS = ("id", "iid")  # Strategy, scope and user list IDs, numbered per GitLab project
+DETAILS_ID_PLACEHOLDER = "\x00{}\x00"  # Stands in for an ID in cached dropdowns, see render_details_dropdown()
+DETAILS_ID_PLACEHOLDER_PATTERN = re.compile(r"\x00(\d+)\x00")
+CANONICAL_JSON_ENCODER = json.JSONEncoder(sort_keys=True, default=str)  # Reused, json.dumps() builds one per call
+WORD_PATTERN = re.compile(r"\w+")
+TAG_PATTERN = re.compile(r"<(/?)([A-Za-z][\w:-]*)[^>]*>")
+DETAILS_TOKEN_PATTERN = re.compile(
+    r"<br\s*/?>|((?:&nbsp;)*)(?:<strong>(.*?):</strong> ?|(- )|((?:(?!<br\s*/?>|<strong>|&nbsp;).)+)|(?=<br|\Z))",
+    re.S,
+)
+global_log = deque(maxlen=LOG_BUFFER_SIZE)  # (level, message) pairs of the current run
+log_level_counts = Counter()  # Messages logged in the current run per level, including dropped ones
+logger = logging.getLogger("feature_flags")
+metrics_lock = threading.Lock()
+stage_durations = {}  # (stage, project) -> duration in seconds of the last run
+stage_seconds_total = Counter()  # (stage, project) -> cumulative duration in seconds
+stage_runs_total = Counter()  # (stage, project) -> number of runs
+metric_counters = Counter()  # Counter name -> value, see METRIC_DESCRIPTIONS
+sync_jobs = OrderedDict()  # Job ID -> job, oldest first
+sync_condition = threading.Condition()
+pending_job_id = None  # Job waiting to run next; further triggers are merged into it
+sync_worker_thread = None
+republish_timer = None
+republish_lock = threading.Lock()
+METRIC_DESCRIPTIONS = {
+    "syncs_total": "Feature flag syncs started.",
+    "sync_failures_total": "Feature flag syncs that failed with an error.",
+    "syncs_skipped_total": "Feature flag syncs that found no changes and skipped the upload.",
+    "pages_fetched_total": "GitLab feature flag pages fetched, including cached pages.",
+    "flags_processed_total": "Feature flags merged from all repositories.",
+    "http_retries_total": "Retried GitLab and Confluence HTTP requests.",
+    "bytes_uploaded_total": "Bytes of page body uploaded to Confluence.",
+}
+gitlab_session = None
+confluence_client = None
+render_pool = None  # Created by get_render_pool()
+render_pool_config = None  # The RENDER_PROCESSES and render settings the pool was started with
+flask_app = None  # Created by get_app()
+confluence_pages = {}  # Page title -> {"id", "version"} of pages looked up or written by this process
+page_bytes = {}  # Page title -> body bytes uploaded by the current sync
+gitlab_cache_writable = True  # False during a dry run, which leaves the GitLab page cache as it was
+host_buckets = {}  # Host -> token bucket state, see RateLimitedAdapter
+host_buckets_lock = threading.Lock()
+fixture_counts = Counter()  # Fixture path -> responses recorded or replayed so far in this process
+fixture_lock = threading.Lock()
+gitlab_cache_stats = {"hits": 0, "misses": 0}
+team_index = None  # Built by build_team_index()
+team_cache = {}  # Flag name -> resolved team
+interned_values = {}  # Canonical hash -> shared strategy or details object, see intern_value()
+environment_states = {}  # (status, shape hash, IDs) -> shared EnvironmentState
+environment_signatures = {}  # Shape hash -> strategy signature, see get_environment_signature()
+user_lists_cache = {}  # Repository ID -> (fetched at, {user list ID: user IDs}), see fetch_user_lists()
+user_lists_lock = threading.Lock()
+details_cache = OrderedDict()  # (page format, shape hash) -> dropdown template, see build_dropdown_template()
+details_cache_stats = {"hits": 0, "misses": 0}
 
 REPOSITORY_MAP = [
     ("prod", PROJECT_ID_PROD),
@@ -36,17 +161,599 @@ REPOSITORY_MAP = [
 headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
 # response = requests.get(GITLAB_API_URL, headers=headers)
 
-def add_to_log(message):
+def _pd():
+    """Returns the pandas module, importing it on first use (see the note at the top of the file)."""
+    import pandas
+    return pandas
+
+def setup_logging():
     """
-    Adds a record to the global log.
+    Configures the script logger with a buffered, rotating file handler.
+
+    Messages are collected in memory and written to LOG_FILE in batches of
+    LOG_FLUSH_CAPACITY, or immediately for errors.
+    """
+    if logger.handlers:
+        return
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding="utf-8", delay=True)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(MemoryHandler(LOG_FLUSH_CAPACITY, flushLevel=logging.ERROR, target=file_handler))
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+setup_logging()
+
+def flush_log():
+    """Writes buffered log messages to the log file."""
+    for handler in logger.handlers:
+        handler.flush()
+
+def start_log_run():
+    """Resets the per-run log buffer at the start of a sync."""
+    global_log.clear()
+    log_level_counts.clear()
+
+def add_to_log(message, level=logging.INFO):
+    """
+    Adds a record to the log file and the per-run log buffer.
+
+    Messages below LOG_LEVEL are discarded. The per-run buffer keeps the last
+    LOG_BUFFER_SIZE messages.
 
     Args:
         message (str): The log message to be added.
+        level (int): The logging level of the message.
+    """
+    if level < LOG_LEVEL:
+        return
+    logger.log(level, message)
+    global_log.append((level, message))
+    log_level_counts[level] += 1
+
+def increment_metric(name, value=1):
+    """
+    Increments a sync counter exposed on /metrics.
+
+    Args:
+        name (str): The counter name, one of METRIC_DESCRIPTIONS.
+        value (int): The amount to add.
+    """
+    with metrics_lock:
+        metric_counters[name] += value
+
+def record_stage(stage, seconds, project=None):
+    """
+    Records the duration of a sync stage.
+
+    Args:
+        stage (str): The stage name.
+        seconds (float): The duration of the stage.
+        project (str, optional): The GitLab project the stage ran for.
+    """
+    with metrics_lock:
+        stage_durations[(stage, project)] = seconds
+        stage_seconds_total[(stage, project)] += seconds
+        stage_runs_total[(stage, project)] += 1
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Times a sync stage and logs its duration.
+
+    Args:
+        stage (str): The stage name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        record_stage(stage, seconds)
+        add_to_log(f"Stage '{stage}' took {seconds:.3f}s.")
+
+def render_metrics():
+    """
+    Renders the sync metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics text.
+    """
+    def labels(stage, project):
+        project_label = f',project="{project}"' if project is not None else ""
+        return f'{{stage="{stage}"{project_label}}}'
+
+    with metrics_lock:
+        lines = [
+            "# HELP feature_flags_stage_duration_seconds Duration of the last run of each sync stage.",
+            "# TYPE feature_flags_stage_duration_seconds gauge",
+        ]
+        lines.extend(f"feature_flags_stage_duration_seconds{labels(*key)} {seconds:.6f}" for key, seconds in stage_durations.items())
+        lines.extend([
+            "# HELP feature_flags_stage_seconds_total Cumulative duration of each sync stage.",
+            "# TYPE feature_flags_stage_seconds_total counter",
+        ])
+        lines.extend(f"feature_flags_stage_seconds_total{labels(*key)} {seconds:.6f}" for key, seconds in stage_seconds_total.items())
+        lines.extend([
+            "# HELP feature_flags_stage_runs_total Number of runs of each sync stage.",
+            "# TYPE feature_flags_stage_runs_total counter",
+        ])
+        lines.extend(f"feature_flags_stage_runs_total{labels(*key)} {runs}" for key, runs in stage_runs_total.items())
+        for name, description in METRIC_DESCRIPTIONS.items():
+            lines.extend([
+                f"# HELP feature_flags_{name} {description}",
+                f"# TYPE feature_flags_{name} counter",
+                f"feature_flags_{name} {metric_counters[name]}",
+            ])
+    return "\n".join(lines) + "\n"
+
+class RateLimitedRetry(Retry):
     """
-    with open("script.log", "a") as log_file:
-        log_file.write(f"{message}\n")
-    global global_log
-    global_log.append(message)
+    urllib3 Retry that paces every retry like a first attempt.
+
+    urllib3 retries inside HTTPAdapter.send(), past RateLimitedAdapter. So after the
+    backoff or Retry-After wait, every retry takes a token of the host's bucket, and a
+    failed attempt that reports the rate limit as used up pauses the host as well.
+    """
+    host = None  # Set on the instances returned by increment()
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if _pool is not None:
+            retry.host = get_host_key(_pool.scheme, _pool.host, _pool.port)
+            if response is not None:
+                pause_rate_limited_host(retry.host, response.headers)
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.host is not None:
+            acquire_host_token(self.host)
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTP adapter that paces requests per host and honours server rate limits.
+
+    Every request takes a token from a per-host bucket holding up to HTTP_RATE_BURST
+    tokens and refilled at HTTP_RATE_LIMIT tokens per second. When a response reports
+    that the rate limit is used up (RateLimit-Remaining: 0), requests to that host wait
+    until the time given by RateLimit-Reset. Retries with backoff and Retry-After are
+    handled by the RateLimitedRetry passed as max_retries, which paces each retry the same way.
+    """
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        host = get_host_key(url.scheme, url.hostname, url.port)
+        acquire_host_token(host)
+        response = super().send(request, **kwargs)
+
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            increment_metric("http_retries_total", len(retries.history))
+            add_to_log(f"Request to {host} was retried {len(retries.history)} times, final status HTTP {response.status_code}.", logging.WARNING)
+
+        if FIXTURE_MODE == "record":
+            save_fixture(request, response)
+
+        pause_rate_limited_host(host, response.headers)
+        return response
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    HTTP adapter that answers requests from fixtures recorded with FIXTURE_MODE = "record".
+
+    Nothing is sent over the network. Responses to repeated requests are replayed in the
+    order they were recorded, and the last one is repeated once they run out. A request
+    without a fixture fails with a requests.ConnectionError, so an incomplete recording
+    cannot pass as an empty result.
+    """
+
+    def send(self, request, **kwargs):
+        path = get_fixture_path(request)
+        try:
+            with open(path) as fixture_file:
+                responses = json.load(fixture_file)["responses"]
+        except FileNotFoundError:
+            raise requests.ConnectionError(f"No fixture recorded for {request.method} {request.url}", request=request)
+        with fixture_lock:
+            fixture = responses[min(fixture_counts[path], len(responses) - 1)]
+            fixture_counts[path] += 1
+
+        response = requests.Response()
+        response.status_code = fixture["status_code"]
+        response.reason = fixture["reason"]
+        response.headers = CaseInsensitiveDict(fixture["headers"])
+        response._content = fixture["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+def get_fixture_path(request):
+    """
+    Determines the fixture file of a request.
+
+    Requests are keyed by method, path and query only. The host is left out so a recording
+    made against one server replays against any URL, and the body is left out because page
+    bodies contain the run log.
+
+    Args:
+        request (requests.PreparedRequest): The request.
+
+    Returns:
+        str: The path of the fixture in FIXTURE_DIR.
+    """
+    url = urlsplit(request.url)
+    key = f"{request.method} {url.path}?{url.query}"
+    return os.path.join(FIXTURE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+def save_fixture(request, response):
+    """
+    Records a response for replay.
+
+    Responses to the same request are kept in order. A fixture from an earlier recording
+    is replaced by the first response recorded for its request in this process.
+
+    Args:
+        request (requests.PreparedRequest): The request.
+        response (requests.Response): Its response.
+    """
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    fixture = {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        # The body is stored decoded, so its encoding headers no longer apply
+        "headers": {name: value for name, value in response.headers.items()
+                    if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")},
+        "body": response.content.decode("utf-8", "replace"),
+    }
+    path = get_fixture_path(request)
+    with fixture_lock:
+        responses = []
+        if fixture_counts[path]:
+            with open(path) as fixture_file:
+                responses = json.load(fixture_file)["responses"]
+        responses.append(fixture)
+        fixture_counts[path] += 1
+        with open(f"{path}.tmp", "w") as fixture_file:
+            json.dump({"request": f"{request.method} {request.url}", "responses": responses}, fixture_file)
+        os.replace(f"{path}.tmp", path)
+
+def get_host_key(scheme, host, port):
+    """
+    Returns the key of a host's token bucket, the same for a request URL and its connection pool.
+
+    Args:
+        scheme (str): "http" or "https".
+        host (str): The host name.
+        port (int or None): The port, None for the default port of the scheme.
+
+    Returns:
+        str: The host and port, e.g. "gitlab.com:443".
+    """
+    return f"{host}:{port or (443 if scheme == 'https' else 80)}"
+
+def pause_rate_limited_host(host, headers):
+    """
+    Pauses requests to a host until RateLimit-Reset once a response reports its rate limit used up.
+
+    Args:
+        host (str): The host the response came from, see get_host_key().
+        headers (Mapping): The response headers.
+    """
+    if headers.get("RateLimit-Remaining") != "0" or not headers.get("RateLimit-Reset"):
+        return
+    reset_at = float(headers["RateLimit-Reset"])
+    with host_buckets_lock:
+        bucket = host_buckets.setdefault(host, {"tokens": HTTP_RATE_BURST, "updated": time.time(), "blocked_until": 0})
+        bucket["blocked_until"] = max(bucket["blocked_until"], reset_at)
+    add_to_log(f"Rate limit of {host} reached, pausing requests until {time.ctime(reset_at)}.", logging.WARNING)
+
+def acquire_host_token(host):
+    """
+    Waits until a request to the host may be sent, according to its token bucket.
+
+    Args:
+        host (str): The host the request is sent to, see get_host_key().
+    """
+    while True:
+        with host_buckets_lock:
+            now = time.time()
+            bucket = host_buckets.setdefault(host, {"tokens": HTTP_RATE_BURST, "updated": now, "blocked_until": 0})
+            bucket["tokens"] = min(HTTP_RATE_BURST, bucket["tokens"] + (now - bucket["updated"]) * HTTP_RATE_LIMIT)
+            bucket["updated"] = now
+            if bucket["blocked_until"] > now:
+                delay = bucket["blocked_until"] - now
+            elif bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                return
+            else:
+                delay = (1 - bucket["tokens"]) / HTTP_RATE_LIMIT
+        time.sleep(delay)
+
+def create_http_session(pool_size):
+    """
+    Creates a pooled HTTP session with retries and per-host rate limiting.
+
+    Idempotent requests are retried up to HTTP_MAX_RETRIES times on connection errors
+    and on HTTP 429, 500, 502, 503 and 504, with jittered exponential backoff. A
+    Retry-After header takes precedence over the backoff. Every attempt, retries included,
+    takes a token of the host's bucket, see RateLimitedRetry. PUT is not retried: a Confluence
+    page update that was stored before the error would be stored again as a new version. With FIXTURE_MODE = "replay"
+    the session answers from recorded fixtures instead, see ReplayAdapter.
+
+    Args:
+        pool_size (int): The number of connections kept alive per host.
+
+    Returns:
+        requests.Session: The session.
+    """
+    retry = RateLimitedRetry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        backoff_max=HTTP_BACKOFF_MAX,
+        backoff_jitter=HTTP_BACKOFF_JITTER,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=RateLimitedRetry.DEFAULT_ALLOWED_METHODS - {"PUT"},
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    if FIXTURE_MODE == "replay":
+        adapter = ReplayAdapter()
+    else:
+        adapter = RateLimitedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_gitlab_session():
+    """
+    Returns the shared GitLab HTTP session, creating it on first use.
+
+    The session keeps connections alive and its pool is sized to GITLAB_MAX_WORKERS,
+    so concurrent page requests reuse connections instead of opening new ones.
+    Requests are retried and rate limited, see create_http_session().
+
+    Returns:
+        requests.Session: The pooled session with the GitLab token header set.
+    """
+    global gitlab_session
+    if gitlab_session is None:
+        session = create_http_session(GITLAB_MAX_WORKERS)
+        session.headers.update({"PRIVATE-TOKEN": GITLAB_TOKEN})
+        gitlab_session = session
+    return gitlab_session
+
+def get_confluence_client():
+    """
+    Returns the shared Confluence client, creating it on first use.
+
+    The client keeps one pooled session (see create_http_session()) for the lifetime of
+    the process, so connections are reused across lookups, fetches and uploads.
+
+    Returns:
+        Confluence: The client.
+    """
+    global confluence_client
+    if confluence_client is None:
+        from atlassian import Confluence
+        confluence_client = Confluence(url=CONFLUENCE_API_URL, username=EMAIL, password=CONFLUENCE_API_TOKEN,
+                                       session=create_http_session(CONFLUENCE_MAX_CONNECTIONS))
+    return confluence_client
+
+def remember_confluence_page(page):
+    """
+    Caches the ID and version of a page returned by the Confluence API.
+
+    Args:
+        page (dict): The page, with "title", "id" and, if expanded, "version".
+    """
+    confluence_pages[page["title"]] = {"id": page["id"], "version": (page.get("version") or {}).get("number")}
+
+def get_cache_path(repo_id, page, per_page):
+    """
+    Builds the on-disk cache file path for a page of feature flags.
+
+    Args:
+        repo_id (int): The ID of the GitLab repository.
+        page (int): The page number.
+        per_page (int): The number of flags per page.
+
+    Returns:
+        str: The path of the cache file.
+    """
+    key = re.sub(r"[^\w.-]", "_", f"{repo_id}_{page}_{per_page}")
+    return os.path.join(GITLAB_CACHE_DIR, f"{key}.json")
+
+def load_cached_page(repo_id, page, per_page):
+    """
+    Loads a cached page of feature flags.
+
+    Args:
+        repo_id (int): The ID of the GitLab repository.
+        page (int): The page number.
+        per_page (int): The number of flags per page.
+
+    Returns:
+        dict or None: The cache entry with "flags", "headers", "etag" and "last_modified", or None if not cached.
+    """
+    if not GITLAB_CACHE_DIR:
+        return None
+    try:
+        with open(get_cache_path(repo_id, page, per_page)) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+def store_cached_page(repo_id, page, per_page, entry):
+    """
+    Stores a page of feature flags in the on-disk cache.
+
+    The file is written to a temporary path first and then moved into place, so a
+    concurrent or interrupted run never reads a partial entry.
+
+    Args:
+        repo_id (int): The ID of the GitLab repository.
+        page (int): The page number.
+        per_page (int): The number of flags per page.
+        entry (dict): The cache entry to store.
+    """
+    if not GITLAB_CACHE_DIR or not gitlab_cache_writable:
+        return
+    os.makedirs(GITLAB_CACHE_DIR, exist_ok=True)
+    path = get_cache_path(repo_id, page, per_page)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as cache_file:
+        json.dump(entry, cache_file)
+    os.replace(tmp_path, path)
+
+def fetch_feature_flags_page(repo_id, page, per_page=GITLAB_PER_PAGE):
+    """
+    Fetches a single page of feature flags for a repository.
+
+    Sends a conditional request when the page is cached. On HTTP 304 the cached
+    flags are returned with the pagination headers of the 304 response, since flags
+    added on later pages change them without changing this page; on HTTP 200 the
+    cache entry is refreshed.
+
+    Args:
+        repo_id (int): The ID of the GitLab repository.
+        page (int): The page number to fetch.
+        per_page (int): The number of flags per page.
+
+    Returns:
+        dict: The page result with "status_code", "flags", "headers" (pagination headers) and "cached".
+    """
+    url = f"{GITLAB_API_URL}/projects/{repo_id}/feature_flags"
+    cached = load_cached_page(repo_id, page, per_page)
+    request_headers = {}
+    if cached:
+        if cached.get("etag"):
+            request_headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            request_headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = get_gitlab_session().get(
+        url, params={"page": page, "per_page": per_page}, headers=request_headers, timeout=GITLAB_TIMEOUT
+    )
+
+    pagination_headers = {
+        name: response.headers[name] for name in ("X-Total-Pages", "X-Next-Page") if name in response.headers
+    }
+    if response.status_code == 304 and cached:
+        headers = {**cached["headers"], **pagination_headers}
+        if headers != cached["headers"]:
+            store_cached_page(repo_id, page, per_page, {**cached, "headers": headers})
+        return {"status_code": 200, "flags": cached["flags"], "headers": headers, "cached": True}
+
+    if response.status_code != 200:
+        return {"status_code": response.status_code, "flags": [], "headers": {}, "cached": False}
+
+    flags = response.json()
+    if response.headers.get("ETag") or response.headers.get("Last-Modified"):
+        store_cached_page(repo_id, page, per_page, {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "headers": pagination_headers,
+            "flags": flags,
+        })
+    return {"status_code": 200, "flags": flags, "headers": pagination_headers, "cached": False}
+
+def get_next_pages(headers, page, flags):
+    """
+    Determines which pages to request after a page has been fetched.
+
+    Uses GitLab's pagination headers: once the first page reports X-Total-Pages all
+    remaining pages are returned at once. GitLab omits X-Total-Pages for very large
+    collections, in which case X-Next-Page is followed. Without either header the
+    next page is requested until an empty page comes back.
+
+    Args:
+        headers (dict): The pagination headers of the fetched page.
+        page (int): The page number that was fetched.
+        flags (list): The flags returned on that page.
+
+    Returns:
+        list: The page numbers to fetch next.
+    """
+    total_pages = headers.get("X-Total-Pages")
+    if total_pages:
+        return list(range(2, int(total_pages) + 1)) if page == 1 else []
+    if "X-Next-Page" in headers:
+        next_page = headers["X-Next-Page"]
+        return [int(next_page)] if next_page else []
+    return [page + 1] if flags else []
+
+def fetch_feature_flags_for_repositories(repo_ids):
+    """
+    Fetches all feature flags for several repositories concurrently.
+
+    The first page of every repository is requested in parallel; remaining pages are
+    scheduled as soon as the pagination headers are known. At most GITLAB_MAX_WORKERS
+    requests are in flight at once, all sharing the pooled GitLab session.
+
+    Args:
+        repo_ids (list): The IDs of the GitLab repositories.
+
+    Returns:
+        dict: A mapping of repository ID to the list of its feature flags, in page order.
+    """
+    pages = {repo_id: {} for repo_id in repo_ids}
+    gitlab_cache_stats["hits"] = gitlab_cache_stats["misses"] = 0
+
+    started = {}
+    finished = {}
+
+    with ThreadPoolExecutor(max_workers=GITLAB_MAX_WORKERS) as executor:
+        pending = {}
+
+        def schedule(repo_id, page):
+            future = executor.submit(fetch_feature_flags_page, repo_id, page)
+            pending[future] = (repo_id, page)
+
+        for repo_id in pages:
+            started[repo_id] = time.perf_counter()
+            schedule(repo_id, 1)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                repo_id, page = pending.pop(future)
+                finished[repo_id] = time.perf_counter()
+                try:
+                    result = future.result()
+                    error = None if result["status_code"] == 200 else f"HTTP {result['status_code']}"
+                except requests.RequestException as e:
+                    error = str(e)
+
+                if error:
+                    # A partial flag list would mark the missing flags as deleted, so fail the whole fetch
+                    for pending_future in pending:
+                        pending_future.cancel()
+                    message = f"Error fetching flags for repository '{repo_id}' on page {page}: {error}"
+                    add_to_log(message, logging.ERROR)
+                    raise RuntimeError(message)
+
+                gitlab_cache_stats["hits" if result["cached"] else "misses"] += 1
+                increment_metric("pages_fetched_total")
+                flags = result["flags"]
+                if not flags:
+                    add_to_log(f"No more flags found for repository '{repo_id}' after page {page}.", logging.DEBUG)
+                else:
+                    pages[repo_id][page] = flags
+                    add_to_log(f"Fetched {len(flags)} flags from repository '{repo_id}' on page {page}.", logging.DEBUG)
+
+                for next_page in get_next_pages(result["headers"], page, flags):
+                    schedule(repo_id, next_page)
+
+    all_flags = {}
+    for repo_id, repo_pages in pages.items():
+        all_flags[repo_id] = [flag for page in sorted(repo_pages) for flag in repo_pages[page]]
+        add_to_log(f"Total flags fetched for repository '{repo_id}': {len(all_flags[repo_id])}.")
+        record_stage("gitlab_fetch", finished[repo_id] - started[repo_id], project=str(repo_id))
+    add_to_log(f"GitLab page cache: {gitlab_cache_stats['hits']} hits, {gitlab_cache_stats['misses']} misses.")
+    return all_flags
 
 def fetch_all_feature_flags(repo_id):
     """
@@ -58,155 +765,1074 @@ def fetch_all_feature_flags(repo_id):
     Returns:
         list: A list of feature flags retrieved from the repository.
     """
-    headers = {"PRIVATE-TOKEN": GITLAB_TOKEN}
-    url = f"{GITLAB_API_URL}/projects/{repo_id}/feature_flags"
-    all_flags = []
+    return fetch_feature_flags_for_repositories([repo_id])[repo_id]
+
+def fetch_feature_flag(repo_id, flag_name):
+    """
+    Fetches a single feature flag from the GitLab API.
+
+    Args:
+        repo_id (int): The ID of the GitLab repository.
+        flag_name (str): The name of the feature flag.
+
+    Returns:
+        dict or None: The feature flag, or None if it does not exist in the repository.
+
+    Raises:
+        requests.HTTPError: If GitLab responds with an error other than 404.
+    """
+    url = f"{GITLAB_API_URL}/projects/{repo_id}/feature_flags/{quote(flag_name, safe='')}"
+    response = get_gitlab_session().get(url, timeout=GITLAB_TIMEOUT)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+def fetch_user_lists(repo_id):
+    """
+    Fetches all feature flag user lists of a repository in bulk.
+
+    The lists are cached for USER_LIST_CACHE_SECONDS, so resolving many flags that use the
+    same lists costs one paginated request per repository.
+
+    Args:
+        repo_id (int): The ID of the GitLab repository.
+
+    Returns:
+        dict: The user IDs (list of str) keyed by user list ID.
+
+    Raises:
+        requests.HTTPError: If GitLab responds with an error.
+    """
+    with user_lists_lock:
+        cached = user_lists_cache.get(repo_id)
+    if cached and time.time() - cached[0] < USER_LIST_CACHE_SECONDS:
+        return cached[1]
+
+    url = f"{GITLAB_API_URL}/projects/{repo_id}/feature_flags_user_lists"
+    user_lists = {}
     page = 1
-    per_page = 100
+    while page:
+        response = get_gitlab_session().get(url, params={"page": page, "per_page": GITLAB_PER_PAGE}, timeout=GITLAB_TIMEOUT)
+        response.raise_for_status()
+        for user_list in response.json():
+            user_lists[user_list["id"]] = split_user_ids(user_list.get("user_xids"))
+        next_page = response.headers.get("X-Next-Page")
+        page = int(next_page) if next_page else None
+
+    with user_lists_lock:
+        user_lists_cache[repo_id] = (time.time(), user_lists)
+    add_to_log(f"Fetched {len(user_lists)} user lists for repository '{repo_id}'.")
+    return user_lists
+
+def fetch_flag_user_ids(flag_name):
+    """
+    Fetches the complete user IDs of a flag's strategies in every environment.
 
-    while True:
-        response = requests.get(url, headers=headers, params={"page": page, "per_page": per_page})
-        if response.status_code != 200:
-            add_to_log(f"Error fetching flags for repository '{repo_id}': HTTP {response.status_code}")
-            break
+    The page only shows the first USER_IDS_PREVIEW IDs of each strategy. Inline IDs come
+    from the flag itself, user lists from fetch_user_lists().
 
-        flags = response.json()
-        if not flags:
-            add_to_log(f"No more flags found for repository '{repo_id}' after page {page}.")
-            break
+    Args:
+        flag_name (str): The name of the feature flag.
 
-        all_flags.extend(flags)
-        add_to_log(f"Fetched {len(flags)} flags from repository '{repo_id}' on page {page}.")
+    Returns:
+        dict: Per environment the strategies with user IDs, as {"strategy", "name", "user_ids"}
+            dictionaries. Environments without the flag are left out.
 
-        page += 1
+    Raises:
+        requests.HTTPError: If GitLab responds with an error.
+    """
+    result = {}
+    for repo_url, repo_id in REPOSITORY_MAP:
+        flag = fetch_feature_flag(repo_id, flag_name)
+        if flag is None:
+            continue
+        strategies = []
+        for strategy in flag.get("strategies", []):
+            user_list = strategy.get("user_list")
+            if user_list:
+                user_ids = fetch_user_lists(repo_id).get(user_list["id"], split_user_ids(user_list.get("user_xids")))
+            elif "userIds" in strategy.get("parameters", {}):
+                user_ids = split_user_ids(strategy["parameters"]["userIds"])
+            else:
+                continue
+            strategies.append({"strategy": strategy["id"], "name": strategy["name"], "user_ids": user_ids})
+        result[repo_url] = strategies
+    return result
+
+def parse_feature_flag_event(payload):
+    """
+    Extracts the project and flag name from a GitLab feature flag webhook or audit event.
 
-    add_to_log(f"Total flags fetched for repository '{repo_id}': {len(all_flags)}.")
-    return all_flags
+    Args:
+        payload (dict): The JSON body sent by GitLab.
+
+    Returns:
+        tuple or None: The project ID and flag name, or None if the payload is not a feature flag event.
+    """
+    if payload.get("object_kind") == "feature_flag":
+        project_id = (payload.get("project") or {}).get("id")
+        flag_name = (payload.get("object_attributes") or {}).get("name")
+    else:
+        details = payload.get("details") or {}
+        target_type = payload.get("target_type") or details.get("target_type")
+        if target_type != "Operations::FeatureFlag":
+            return None
+        project_id = payload.get("entity_id")
+        flag_name = payload.get("target_details") or details.get("target_details")
+    if project_id is None or not flag_name:
+        return None
+    return project_id, flag_name
+
+def build_team_index():
+    """
+    Builds the lookup tables used to resolve teams from flag names.
+
+    Team names and aliases are lowercased once into a word -> (priority, team) map, where
+    the priority is the team's position in TEAMS, so that a flag naming several teams
+    resolves to the first one listed. Prefixes are sorted longest first.
+
+    Returns:
+        dict: The index with "words" and "prefixes" entries.
+    """
+    words = {}
+    for priority, team in enumerate(TEAMS):
+        for word in [team, *TEAM_ALIASES.get(team, [])]:
+            words.setdefault(word.lower(), (priority, team))
+    prefixes = sorted(
+        ((prefix.lower(), team) for team, team_prefixes in TEAM_PREFIXES.items() for prefix in team_prefixes),
+        key=lambda item: len(item[0]),
+        reverse=True,
+    )
+    return {"words": words, "prefixes": prefixes}
+
+def reset_team_index():
+    """Discards the team index and resolved teams, e.g. after TEAMS has changed."""
+    global team_index
+    team_index = None
+    team_cache.clear()
 
 def get_team_from_flag_name(flag_name):
     """
     Determines the team associated with a feature flag based on its name.
 
+    A team matches when its name or one of its aliases is a word of the flag name;
+    otherwise the longest matching prefix from TEAM_PREFIXES is used. Results are
+    memoized per flag name, since the same flag appears in every environment.
+
     Args:
         flag_name (str): The name of the feature flag.
 
     Returns:
         str or None: The name of the team if found, otherwise None.
     """
+    if flag_name in team_cache:
+        return team_cache[flag_name]
+
+    global team_index
+    if team_index is None:
+        team_index = build_team_index()
+
     # Split the flag name into words (converted to lowercase for comparison)
-    words = re.findall(r'\w+', flag_name.lower())
-    for team in TEAMS:
-        if team.lower() in words:
-            return team  # Return the team name if found
-    return None
+    lowered = flag_name.lower()
+    words = team_index["words"]
+    matches = [words[word] for word in WORD_PATTERN.findall(lowered) if word in words]
+    if matches:
+        team = min(matches)[1]  # Return the first listed team found
+    else:
+        team = next((team for prefix, team in team_index["prefixes"] if lowered.startswith(prefix)), None)
+
+    team_cache[flag_name] = team
+    return team
+
+def format_owned_by(flag):
+    """
+    Builds the "Owned by" value of a flag from its creator and the team found in its name.
+
+    Args:
+        flag (dict): The feature flag as returned by the GitLab API.
+
+    Returns:
+        str: The owner, e.g. "Jane Doe (Payments)", without "Unknown" and repeated words.
+    """
+    team_name = get_team_from_flag_name(flag["name"])
+    created_by = flag.get("created_by", {}).get("name", "Unknown")
+    owned_by = f"{created_by} ({team_name})" if team_name else created_by
+    owned_by = owned_by.replace("Unknown", "").strip()
+    return " ".join(dict.fromkeys(owned_by.split()))
+
+class EnvironmentState:
+    """
+    The state of a feature flag in one environment, i.e. one repository cell of the table.
+
+    GitLab numbers strategies, scopes and user lists per project, so details are split into
+    a shape without those IDs, shared by every cell with the same strategies and scopes,
+    and the IDs of the cell (see split_details_ids()). Instances are shared and must not be
+    modified: get_environment_state() returns the same object for equal cells.
+
+    Attributes:
+        status (str): "Enabled", "Disabled", "Deleted" or another status read from the page.
+        shape (dict): The scopes, strategies and user_list of the flag, with every ID set to None.
+        ids (tuple): The IDs taken out of the shape.
+        key (bytes): The canonical hash of the shape.
+    """
+    __slots__ = ("status", "shape", "ids", "key")
+
+    def __init__(self, status, shape, ids, key):
+        self.status = status
+        self.shape = shape
+        self.ids = ids
+        self.key = key
+
+    @property
+    def details(self):
+        """dict: The scopes, strategies and user_list of the flag, with their IDs."""
+        return join_details_ids(self.shape, self.ids) if self.ids else self.shape
+
+    def __repr__(self):
+        return f"EnvironmentState({self.status!r}, {self.details!r})"
+
+def canonical_hash(value):
+    """
+    Hashes a JSON-like value independently of its dictionary key order.
+
+    Args:
+        value (any): The value to hash.
+
+    Returns:
+        bytes: The SHA-1 digest of the value serialized with sorted keys.
+    """
+    return hashlib.sha1(CANONICAL_JSON_ENCODER.encode(value).encode("utf-8")).digest()
+
+def intern_value(value):
+    """
+    Returns the shared copy of a JSON-like value, so equal values are kept in memory once.
+
+    Args:
+        value (dict or list): The value to intern. It must not be modified afterwards.
+
+    Returns:
+        tuple: The shared value and its canonical hash (bytes).
+    """
+    key = canonical_hash(value)
+    return interned_values.setdefault(key, value), key
+
+def split_details_ids(value):
+    """
+    Takes the per-project IDs ("id" and "iid" keys) out of a JSON-like value.
+
+    IDs are collected in sorted key order, so values that differ only in key order
+    give the same shape and the same ID order.
+
+    Args:
+        value (any): The details, or a part of them.
+
+    Returns:
+        tuple: The value with every ID set to None, and the IDs (list) in visiting order.
+    """
+    ids = []
+
+    def split(part):
+        if isinstance(part, dict):
+            shape = dict(part)
+            for name in sorted(part):
+                item = part[name]
+                if isinstance(item, (dict, list)):
+                    shape[name] = split(item)
+                elif name in DETAILS_ID_KEYS:
+                    ids.append(item)
+                    shape[name] = None
+            return shape
+        return [split(item) if isinstance(item, (dict, list)) else item for item in part]
+
+    return split(value) if isinstance(value, (dict, list)) else value, ids
+
+def join_details_ids(shape, ids):
+    """
+    Puts the IDs taken out by split_details_ids() back into a shape.
+
+    Args:
+        shape (any): The value with its IDs set to None.
+        ids (tuple): The IDs in visiting order.
+
+    Returns:
+        any: A new value with the IDs.
+    """
+    remaining = iter(ids)
+
+    def join(part):
+        if isinstance(part, dict):
+            values = dict(part)
+            for name in sorted(part):
+                item = part[name]
+                if isinstance(item, (dict, list)):
+                    values[name] = join(item)
+                elif name in DETAILS_ID_KEYS:
+                    values[name] = next(remaining)
+            return values
+        return [join(item) if isinstance(item, (dict, list)) else item for item in part]
+
+    return join(shape) if isinstance(shape, (dict, list)) else shape
+
+def get_environment_state(status, details):
+    """
+    Returns the shared EnvironmentState for a status and its details.
+
+    The details are interned without their IDs, see split_details_ids().
+
+    Args:
+        status (str): The status of the flag in the environment.
+        details (dict): The details of the flag in the environment.
+
+    Returns:
+        EnvironmentState: The interned state.
+    """
+    shape, ids = split_details_ids(details)
+    shape, key = intern_value(shape)
+    ids = tuple(ids)
+    state = environment_states.get((status, key, ids))
+    if state is None:
+        state = environment_states[(status, key, ids)] = EnvironmentState(status, shape, ids, key)
+    return state
+
+def reset_interned_states():
+    """Drops the interned values, so states of earlier syncs can be garbage collected."""
+    interned_values.clear()
+    environment_states.clear()
+    environment_signatures.clear()
+
+def json_default(value):
+    """
+    Serializes values json.dumps() does not know, an EnvironmentState as its status, shape hash and IDs.
+
+    Args:
+        value (any): The value to serialize.
+
+    Returns:
+        any: A JSON-serializable representation of the value.
+    """
+    if isinstance(value, EnvironmentState):
+        return [value.status, value.key.hex(), value.ids]
+    return str(value)
+
+def split_user_ids(user_ids):
+    """
+    Splits the comma-separated user IDs of a strategy or user list.
+
+    Args:
+        user_ids (str, list or None): The user IDs as sent by GitLab.
+
+    Returns:
+        list: The user IDs as strings.
+    """
+    if isinstance(user_ids, list):
+        return [str(user_id) for user_id in user_ids]
+    return [user_id.strip() for user_id in (user_ids or "").split(",") if user_id.strip()]
+
+def make_user_ids_reference(user_ids):
+    """
+    Builds the reference stored in place of a list of user IDs.
+
+    Args:
+        user_ids (str, list or None): The user IDs as sent by GitLab.
+
+    Returns:
+        dict: The number of IDs ("count"), a digest of all IDs ("digest") and the
+            first USER_IDS_PREVIEW IDs ("preview").
+    """
+    if isinstance(user_ids, str):
+        # Count and hash the string as is, splitting only the previewed IDs
+        joined = user_ids.replace(" ", "").strip(",")
+        if ",," in joined:
+            joined = ",".join(split_user_ids(joined))
+        count = joined.count(",") + 1 if joined else 0
+        preview = joined.split(",", USER_IDS_PREVIEW)[:USER_IDS_PREVIEW] if joined else []
+    else:
+        user_ids = split_user_ids(user_ids)
+        joined, count, preview = ",".join(user_ids), len(user_ids), user_ids[:USER_IDS_PREVIEW]
+    return {
+        "count": count,
+        "digest": hashlib.sha1(joined.encode("utf-8")).hexdigest()[:16],
+        "preview": preview,
+    }
+
+def is_user_ids_reference(value):
+    """Returns whether a details value is a reference built by make_user_ids_reference()."""
+    return isinstance(value, dict) and value.keys() == {"count", "digest", "preview"}
+
+def build_environment_cell(flag):
+    """
+    Builds the repository column value of a flag for one environment.
+
+    The details are interned, so flags and environments with identical scopes and
+    strategies share one copy of them. User IDs, inline or in a user list, are replaced
+    by a reference (see make_user_ids_reference()); fetch_flag_user_ids() gets them all.
+
+    Args:
+        flag (dict): The feature flag as returned by the GitLab API.
+
+    Returns:
+        EnvironmentState: The status ("Enabled" or "Disabled") and the details with scopes, strategies and user_list.
+    """
+    # Extract scopes, strategies, and user_list
+    scopes = flag.get("scopes", [])
+    strategies = flag.get("strategies", [])
+    user_list = strategies[0].get("user_list") if strategies else None
+    if user_list:
+        user_list = {
+            "id": user_list.get("id"),
+            "iid": user_list.get("iid"),
+            "name": user_list.get("name"),
+            "user_xids": make_user_ids_reference(user_list.get("user_xids")),
+        }
+
+    strategies_data = []
+    for strategy in strategies:
+        parameters = strategy["parameters"]
+        if "userIds" in parameters:
+            parameters = {**parameters, "userIds": make_user_ids_reference(parameters["userIds"])}
+        strategies_data.append({
+            "id": strategy["id"],
+            "name": strategy["name"],
+            "parameters": parameters,
+            "scopes": strategy.get("scopes", []),
+        })
+
+    return get_environment_state(
+        "Enabled" if flag["active"] else "Disabled",
+        {
+            "scopes": scopes,
+            "strategies": strategies_data,
+            "user_list": user_list,
+        },
+    )
 
 def merge_feature_flags():
     """
     Merges feature flags from multiple repositories into a consolidated structure.
 
+    The table is built column by column, and every repository cell is a shared
+    EnvironmentState (see build_environment_cell()).
+
     Returns:
         pd.DataFrame: A DataFrame containing all feature flags and their details.
     """
-    all_flags = {}
-    seen_flags = set()  # Track flags found in the current iteration
+    environment_columns = list(dict.fromkeys(repo_url for repo_url, _ in REPOSITORY_MAP))
+    columns = {column: [] for column in BASE_COLUMNS + environment_columns}
+    row_indexes = {}  # Flag name -> row
+    active = []  # Whether the flag is active in any environment, per row
+
+    # Fetch feature flags for all repositories concurrently
+    add_to_log(f"Fetching feature flags for repositories: {', '.join(repo_url for repo_url, _ in REPOSITORY_MAP)}")
+    flags_by_repo = fetch_feature_flags_for_repositories(list(dict.fromkeys(repo_id for _, repo_id in REPOSITORY_MAP)))
 
-    # Iterate through each repository and fetch feature flags
     for repo_url, repo_id in REPOSITORY_MAP:
-        add_to_log(f"Fetching feature flags for repository: {repo_url}")
-        flags = fetch_all_feature_flags(repo_id)
-        
-        for flag in flags:
+        for flag in flags_by_repo[repo_id]:
             flag_name = flag["name"]
-            seen_flags.add(flag_name)
-
-            if flag_name not in all_flags:  # Initialize new flag data
-                team_name = get_team_from_flag_name(flag_name)
-                created_by = flag.get("created_by", {}).get("name", "Unknown")
-                owned_by = f"{created_by} ({team_name})" if team_name else created_by
-
-                all_flags[flag_name] = {
-                    "Feature toggle name": flag_name,
-                    "Feature description": flag.get("description", ""),
-                    "Owned by": owned_by,
-                    "Status": set(),
-                }
+            index = row_indexes.get(flag_name)
+            if index is None:  # Initialize new flag data
+                index = row_indexes[flag_name] = len(active)
+                columns["Feature toggle name"].append(flag_name)
+                columns["Feature description"].append(flag.get("description", ""))
+                columns["Owned by"].append(format_owned_by(flag))
+                for environment in environment_columns:
+                    columns[environment].append(float("nan"))  # Missing, as in a table built from row dictionaries
+                active.append(False)
+
+            columns[repo_url][index] = build_environment_cell(flag)
+            active[index] = active[index] or flag["active"]
+
+    columns["Status"] = ["In Use 🟢" if is_active else "Inactive ⚪" for is_active in active]
+    # Repositories without any flag get no column, as with a table built row by row
+    for environment in environment_columns:
+        if not any(isinstance(cell, EnvironmentState) for cell in columns[environment]):
+            del columns[environment]
+
+    increment_metric("flags_processed_total", len(active))
+    add_to_log(f"Completed merging of feature flags. Total flags processed: {len(active)}")
+    return _pd().DataFrame(columns)
+
+def normalize_scopes(scopes):
+    """
+    Returns the sorted environment scopes of a scope list, without their project-specific IDs.
 
-            # Extract scopes, strategies, and user_list
-            scopes = flag.get("scopes", [])
-            strategies = flag.get("strategies", [])
-            user_list = strategies[0].get("user_list") if strategies else None
-
-            strategies_data = [
-                {
-                    "id": strategy["id"],
-                    "name": strategy["name"],
-                    "parameters": strategy["parameters"],
-                    "scopes": strategy.get("scopes", []),
-                }
-                for strategy in strategies
-            ]
-
-            # Add status with JSON object containing scopes, strategies, and user_list
-            all_flags[flag_name][repo_url] = {
-                "status": "Enabled" if flag["active"] else "Disabled",
-                "details": {
-                    "scopes": scopes,
-                    "strategies": strategies_data,
-                    "user_list": user_list,
-                },
-            }
-            status = "Active" if flag["active"] else "Inactive"
-            all_flags[flag_name]["Status"].add(status)
-
-    # Handle deleted flags
-    for flag_name in list(all_flags.keys()):
-        if flag_name not in seen_flags:
-            for repo_url, _ in REPOSITORY_MAP:
-                all_flags[flag_name][repo_url] = {
-                    "status": "Deleted",
-                    "details": {
-                        "scopes": "N/A",
-                        "strategies": "N/A",
-                        "user_list": "N/A",
-                    },
-                }
-            all_flags[flag_name]["Status"] = "Deleted 🔴"
-        else:
-            statuses = all_flags[flag_name]["Status"]
-            if "Active" in statuses:
-                all_flags[flag_name]["Status"] = "In Use 🟢"
-            elif "Inactive" in statuses:
-                all_flags[flag_name]["Status"] = "Inactive ⚪"
-
-    # Additional logic for retaining descriptions and ownership for deleted flags
-    for flag_name in all_flags:
-        if flag_name not in seen_flags:
-            all_flags[flag_name]["Feature description"] = all_flags[flag_name].get("Feature description", "No description")
-            all_flags[flag_name]["Owned by"] = all_flags[flag_name].get("Owned by", "Unknown")
-            add_to_log(f"Retained data for deleted flag: {flag_name}")
-
-    for flag_name in all_flags:
-        owned_by = all_flags[flag_name]["Owned by"]
-        owned_by = owned_by.replace("Unknown", "").strip()
-        owned_by = " ".join(dict.fromkeys(owned_by.split()))
-        all_flags[flag_name]["Owned by"] = owned_by
-
-    # Transform data to DataFrame
-    expanded_data = []
-    for flag_name, flag_data in all_flags.items():
-        row = {
-            "Feature toggle name": flag_data["Feature toggle name"],
-            "Feature description": flag_data["Feature description"],
-            "Owned by": flag_data["Owned by"],
-            "Status": flag_data["Status"],
+    Args:
+        scopes (list or str): The scopes as stored in the details. Tables read back from the
+            page may hold an empty string instead of a list.
+
+    Returns:
+        list: The environment scopes.
+    """
+    if not isinstance(scopes, list):
+        return []
+    return sorted(str(scope.get("environment_scope") if isinstance(scope, dict) else scope) for scope in scopes)
+
+def normalize_details(details):
+    """
+    Reduces the details of a flag to what is comparable across environments.
+
+    Strategy, scope and user list IDs are dropped, as every project numbers them on its own,
+    and strategies are sorted. User ID references keep only their count and digest.
+
+    Args:
+        details (dict): The details of an EnvironmentState.
+
+    Returns:
+        dict: The normalized scopes, strategies and user list.
+    """
+    strategies = []
+    for strategy in details.get("strategies") or []:
+        parameters = strategy.get("parameters") if isinstance(strategy.get("parameters"), dict) else {}
+        strategies.append({
+            "name": strategy.get("name"),
+            "parameters": {
+                name: {"count": value["count"], "digest": value["digest"]} if is_user_ids_reference(value) else value
+                for name, value in parameters.items()
+            },
+            "scopes": normalize_scopes(strategy.get("scopes")),
+        })
+    user_list = details.get("user_list")
+    if isinstance(user_list, dict):
+        user_ids = user_list.get("user_xids")
+        if is_user_ids_reference(user_ids):
+            user_ids = {"count": user_ids["count"], "digest": user_ids["digest"]}
+        user_list = {"name": user_list.get("name"), "user_xids": user_ids}
+    return {
+        "scopes": normalize_scopes(details.get("scopes")),
+        "strategies": sorted(strategies, key=CANONICAL_JSON_ENCODER.encode),
+        "user_list": user_list,
+    }
+
+def get_environment_signature(cell):
+    """
+    Returns the signature of a flag in one environment.
+
+    The strategy signature is computed once per distinct shape (see get_environment_state())
+    and cached, so a report over the whole table hashes each shape only once.
+
+    Args:
+        cell (EnvironmentState or any): A repository cell of the table.
+
+    Returns:
+        tuple or None: Whether the flag is active (bool) and its strategy signature (str),
+            or None if the flag does not exist in the environment.
+    """
+    if not isinstance(cell, EnvironmentState) or cell.status not in ("Enabled", "Disabled"):
+        return None
+    signature = environment_signatures.get(cell.key)
+    if signature is None:
+        signature = environment_signatures[cell.key] = canonical_hash(normalize_details(cell.shape)).hex()[:16]
+    return cell.status == "Enabled", signature
+
+def build_drift_report(table):
+    """
+    Lists the flags whose state differs between environments, in one pass over the table.
+
+    Flags deleted from GitLab ("Deleted 🔴") are skipped.
+
+    Args:
+        table (pd.DataFrame): The table in the format returned by merge_feature_flags().
+
+    Returns:
+        dict: The "environments" compared, the number of "flags" and the "drift" per kind of
+            DRIFT_KINDS: flags missing in some environments ("missing"), enabled in some
+            environments only ("enabled") and with different strategies ("strategy").
+    """
+    environments = [column for column in table.columns if column not in BASE_COLUMNS]
+    drift = {kind: [] for kind in DRIFT_KINDS}
+    for flag_name, flag_status, *cells in table[["Feature toggle name", "Status", *environments]].itertuples(index=False, name=None):
+        if flag_status == "Deleted 🔴":
+            continue
+        signatures = {
+            environment: signature for environment, signature in zip(environments, map(get_environment_signature, cells))
+            if signature is not None
         }
-        for repo_url, status_info in flag_data.items():
-            if isinstance(status_info, dict):  # Handle statuses with details
-                row[f"{repo_url}"] = status_info  # JSON with status and details
-        expanded_data.append(row)
+        if not signatures:
+            continue  # Not in any environment
+        if len(signatures) < len(environments):
+            drift["missing"].append({
+                "flag": flag_name,
+                "environments": list(signatures),
+                "missing": [environment for environment in environments if environment not in signatures],
+            })
+        enabled = [environment for environment, (active, _) in signatures.items() if active]
+        if 0 < len(enabled) < len(signatures):
+            drift["enabled"].append({
+                "flag": flag_name,
+                "enabled": enabled,
+                "disabled": [environment for environment in signatures if environment not in enabled],
+            })
+        if len({signature for _, signature in signatures.values()}) > 1:
+            drift["strategy"].append({
+                "flag": flag_name,
+                "signatures": {environment: signature for environment, (_, signature) in signatures.items()},
+            })
+    return {"environments": environments, "flags": len(table), "drift": drift}
+
+def get_drift_report():
+    """
+    Builds the drift report of the flags in the flag store.
 
-    add_to_log(f"Completed merging of feature flags. Total flags processed: {len(expanded_data)}")
-    return pd.DataFrame(expanded_data)
+    The report is read from the store only. Merging from GitLab here would run next to a
+    sync on the same module state (interned states, caches and metrics).
+
+    Returns:
+        dict or None: The report, see build_drift_report(), or None if the store is disabled or empty.
+    """
+    table = load_flag_table_from_store() if FLAG_STORE_PATH else None
+    return build_drift_report(table) if table is not None else None
+
+def parse_details_markup(markup):
+    """
+    Converts the markup produced by format_details() back into a JSON-like structure.
+
+    Scalars are restored as None, booleans or integers where they look like one, and as
+    strings otherwise. Empty lists and dictionaries are rendered as nothing and come back
+    as empty strings.
+
+    Args:
+        markup (str): The inner HTML of the dropdown's <pre> block.
+
+    Returns:
+        dict or list or str: The recovered details.
+    """
+    # Tokenize into (level, kind, value), where kind is "key", "item", "scalar" or "br"
+    tokens = []
+    for match in DETAILS_TOKEN_PATTERN.finditer(markup):
+        indent, key, item, scalar = match.group(1, 2, 3, 4)
+        if indent is None:
+            tokens.append((0, "br", None))
+            continue
+        level = len(indent) // 24  # Four "&nbsp;" per level
+        if not indent and tokens and tokens[-1][1] in ("key", "item"):
+            level = tokens[-1][0] + 1  # Compact pages do not indent a value on the line of its key or marker
+        if key is not None:
+            tokens.append((level, "key", html.unescape(key)))
+        elif item is not None:
+            tokens.append((level, "item", None))
+        elif scalar is not None:
+            tokens.append((level, "scalar", html.unescape(scalar) if "&" in scalar else scalar))
+        elif indent:
+            tokens.append((level, "scalar", ""))
+
+    def coerce(text):
+        if text == "None":
+            return None
+        if text in ("True", "False"):
+            return text == "True"
+        if re.fullmatch(r"-?\d+", text):
+            return int(text)
+        return text
+
+    def parse_value(index, level):
+        if index >= len(tokens) or tokens[index][0] != level or tokens[index][1] == "br":
+            return "", index
+        kind = tokens[index][1]
+        if kind == "scalar":
+            return coerce(tokens[index][2]), index + 1
+        result = {} if kind == "key" else []
+        while index < len(tokens) and tokens[index][1] == kind and tokens[index][0] == level:
+            key = tokens[index][2]
+            value, index = parse_value(index + 1, level + 1)
+            if index < len(tokens) and tokens[index][1] == "br":
+                index += 1
+            if kind == "key":
+                result[key] = value
+            else:
+                result.append(value)
+        return result, index
+
+    return parse_value(0, 0)[0]
+
+def parse_feature_flag_table(page_content):
+    """
+    Parses the first feature flag table from a Confluence storage-format body.
+
+    The table is scanned in a single pass over its tags with a precompiled pattern, and
+    nothing after its closing tag is parsed, so the log block is never read. Repository
+    columns are recovered as EnvironmentState objects: the status comes from the status
+    icon and the details from the "Show scope" dropdown, if present.
+
+    Args:
+        page_content (str): The storage-format body of the page.
+
+    Returns:
+        pd.DataFrame or None: The parsed table, or None if no table with a header row is found.
+    """
+    start = page_content.find("<table")
+    if start == -1:
+        return None
+    end = page_content.find("</table>", start)
+    body = page_content[start:end if end != -1 else len(page_content)]
+
+    columns = None
+    rows = []
+    row = cell = None
+    skip_depth = 0
+    position = 0
+
+    while True:
+        match = TAG_PATTERN.search(body, position)
+        if match is None:
+            break
+        if match.start() > position and cell is not None and not skip_depth:
+            data = body[position:match.start()]
+            if "&" in data:
+                data = html.unescape(data)
+            if cell["status"] is None:
+                for char, status in STATUS_ICON_CHARS.items():
+                    if char in data:
+                        cell["status"] = status
+                        break
+            cell["text"].append(data)
+        position = match.end()
+        closing, tag = match.group(1), match.group(2).lower()
+
+        if not closing:
+            if tag == "tr":
+                row = []
+            elif tag in ("th", "td"):
+                cell = {"tag": tag, "text": [], "status": None}
+            elif cell is None:
+                continue
+            elif tag == "ac:parameter":
+                skip_depth += 1
+            elif tag == "pre":
+                # Hand the whole dropdown to the details parser and continue after it
+                pre_end = body.find("</pre>", position)
+                pre_end = len(body) if pre_end == -1 else pre_end
+                cell["details"] = parse_details_markup(body[position:pre_end])
+                position = pre_end + len("</pre>")
+        elif tag == "tr" and row is not None:
+            if row and row[0]["tag"] == "th" and columns is None:
+                columns = [header["text"] for header in row]
+            elif row and row[0]["tag"] == "td":
+                rows.append(row)
+            row = None
+        elif tag in ("th", "td") and cell is not None:
+            cell["text"] = "".join(cell["text"]).strip()
+            if row is not None:
+                row.append(cell)
+            cell = None
+        elif tag == "ac:parameter" and skip_depth:
+            skip_depth -= 1
+
+    if columns is None:
+        return None
+
+    records = []
+    for row in rows:
+        record = {}
+        for column, cell in zip(columns, row):
+            if column in BASE_COLUMNS:
+                record[column] = cell["text"]
+            else:
+                record[column] = get_environment_state(
+                    cell["status"] or cell["text"] or "Not Available",
+                    cell.get("details", {}),
+                )
+        records.append(record)
+    return _pd().DataFrame(records, columns=columns)
+
+FLAG_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flags (
+    name TEXT PRIMARY KEY,
+    description TEXT,
+    owned_by TEXT,
+    status TEXT,
+    first_seen_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flag_environments (
+    name TEXT NOT NULL REFERENCES flags (name),
+    environment TEXT NOT NULL,
+    status TEXT NOT NULL,
+    details TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (name, environment)
+);
+CREATE INDEX IF NOT EXISTS flag_environments_by_status ON flag_environments (environment, status);
+"""
+
+def open_flag_store():
+    """
+    Opens the local flag store, creating its tables if needed.
+
+    Returns:
+        sqlite3.Connection: The connection to FLAG_STORE_PATH.
+    """
+    connection = sqlite3.connect(FLAG_STORE_PATH)
+    connection.executescript(FLAG_STORE_SCHEMA)
+    return connection
+
+def load_flag_table_from_store():
+    """
+    Loads all flags from the local flag store in the format returned by merge_feature_flags().
+
+    Repository columns follow the order of REPOSITORY_MAP, followed by any other
+    stored environments.
+
+    Returns:
+        pd.DataFrame or None: The stored flags, or None if the store is empty.
+    """
+    if not os.path.exists(FLAG_STORE_PATH):
+        return None  # Not created yet, and a read (e.g. in a dry run) should not create it
+    with closing(open_flag_store()) as connection:
+        flags = connection.execute("SELECT name, description, owned_by, status FROM flags ORDER BY rowid").fetchall()
+        environments = connection.execute("SELECT name, environment, status, details FROM flag_environments").fetchall()
+    if not flags:
+        return None
+
+    records = {
+        name: {
+            "Feature toggle name": name,
+            "Feature description": description or "",
+            "Owned by": owned_by or "",
+            "Status": status or "",
+        }
+        for name, description, owned_by, status in flags
+    }
+    states = {}  # (status, details JSON) -> state, so equal cells are decoded once
+    for name, environment, status, details in environments:
+        # Entries stored without details were plain status strings, e.g. "Deleted"
+        if details is None:
+            records[name][environment] = status
+            continue
+        state = states.get((status, details))
+        if state is None:
+            state = states[(status, details)] = get_environment_state(status, json.loads(details))
+        records[name][environment] = state
+
+    stored_environments = {environment for _, environment, _, _ in environments}
+    environment_columns = [repo_url for repo_url in dict.fromkeys(repo_url for repo_url, _ in REPOSITORY_MAP)
+                           if repo_url in stored_environments]
+    environment_columns += sorted(stored_environments - set(environment_columns))
+    return _pd().DataFrame(list(records.values()), columns=BASE_COLUMNS + environment_columns)
+
+def save_flag_table_to_store(table, fetched_at=None):
+    """
+    Writes the consolidated flag table to the local flag store in a single transaction.
+
+    Rows are stamped with the time the flags were fetched. Rows that a webhook patched
+    with a later fetch (see patch_flag_in_store()) are newer than the table and kept.
+    A stored environment that is empty in the table is marked "Deleted", keeping its
+    details, as patch_flag_in_store() does when a flag is deleted from one environment.
+
+    Args:
+        table (pd.DataFrame): The table to store, in the format returned by update_table().
+        fetched_at (float, optional): When the flags were fetched from GitLab, now if not given.
+    """
+    now = fetched_at or time.time()
+    isna = _pd().isna
+    columns = list(table.columns)
+    environment_columns = [column for column in columns if column not in BASE_COLUMNS]
+    flag_rows = []
+    environment_rows = []
+    missing_rows = []
+    details_json = {}  # (shape hash, IDs) -> JSON, so equal details are encoded once
+    for row in table.itertuples(index=False, name=None):
+        record = dict(zip(columns, row))
+        name = record["Feature toggle name"]
+        flag_rows.append((
+            name,
+            *(None if isna(record.get(column)) else str(record[column])
+              for column in ("Feature description", "Owned by", "Status")),
+            now,
+            now,
+        ))
+        for environment in environment_columns:
+            cell = record[environment]
+            if isinstance(cell, EnvironmentState):
+                details = details_json.get((cell.key, cell.ids))
+                if details is None:
+                    details = details_json[(cell.key, cell.ids)] = json.dumps(cell.details, default=str)
+                environment_rows.append((name, environment, cell.status, details, now))
+            elif isinstance(cell, str) and cell:
+                environment_rows.append((name, environment, cell, None, now))
+            elif isna(cell):
+                missing_rows.append((now, name, environment, now))
+
+    with closing(open_flag_store()) as connection, connection:
+        connection.executemany(
+            """
+            INSERT INTO flags (name, description, owned_by, status, first_seen_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                description = excluded.description,
+                owned_by = excluded.owned_by,
+                status = excluded.status,
+                updated_at = excluded.updated_at
+            WHERE flags.updated_at <= excluded.updated_at
+            """,
+            flag_rows,
+        )
+        connection.executemany(
+            """
+            INSERT INTO flag_environments (name, environment, status, details, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (name, environment) DO UPDATE SET
+                status = excluded.status,
+                details = excluded.details,
+                updated_at = excluded.updated_at
+            WHERE flag_environments.updated_at <= excluded.updated_at
+            """,
+            environment_rows,
+        )
+        connection.executemany(
+            "UPDATE flag_environments SET status = 'Deleted', updated_at = ? "
+            "WHERE name = ? AND environment = ? AND updated_at <= ?",
+            missing_rows,
+        )
+        # Flags patched during the sync kept their newer environments, recompute their status from them
+        connection.execute(
+            """
+            UPDATE flags SET status = CASE
+                WHEN EXISTS (SELECT 1 FROM flag_environments e WHERE e.name = flags.name AND e.status = 'Enabled')
+                    THEN 'In Use 🟢'
+                WHEN EXISTS (SELECT 1 FROM flag_environments e WHERE e.name = flags.name AND e.status = 'Disabled')
+                    THEN 'Inactive ⚪'
+                ELSE 'Deleted 🔴'
+            END
+            WHERE name IN (SELECT name FROM flag_environments WHERE updated_at > ?)
+            """,
+            (now,),
+        )
+    add_to_log(f"Saved {len(flag_rows)} flags to the flag store.")
+
+def query_flag_store(environment=None, status=None):
+    """
+    Queries the per-environment state of flags from the local flag store.
+
+    Args:
+        environment (str, optional): Only return entries for this environment.
+        status (str, optional): Only return entries with this status, e.g. "Enabled".
+
+    Returns:
+        list: Dictionaries with the flag's name, overall status, environment, environment status and details.
+    """
+    query = """
+        SELECT f.name, f.status, e.environment, e.status, e.details, e.updated_at
+        FROM flag_environments e JOIN flags f ON f.name = e.name
+        WHERE (:environment IS NULL OR e.environment = :environment)
+          AND (:status IS NULL OR e.status = :status)
+        ORDER BY f.name, e.environment
+    """
+    with closing(open_flag_store()) as connection:
+        rows = connection.execute(query, {"environment": environment, "status": status}).fetchall()
+    return [
+        {
+            "name": name,
+            "flag_status": flag_status,
+            "environment": environment,
+            "status": environment_status,
+            "details": json.loads(details) if details else None,
+            "updated_at": updated_at,
+        }
+        for name, flag_status, environment, environment_status, details, updated_at in rows
+    ]
+
+def find_confluence_page_id(page_title):
+    """
+    Looks up the ID of a Confluence page without downloading its body.
+
+    The ID and version are cached, so a page is looked up at most once per process.
+    PAGE_ID, when set, is used for the page titled PAGE_TITLE without a lookup.
+
+    Args:
+        page_title (str): The title of the Confluence page.
+
+    Returns:
+        str or None: The page ID, or None if the page is not found.
+    """
+    if page_title in confluence_pages:
+        return confluence_pages[page_title]["id"]
+    if PAGE_ID and page_title == PAGE_TITLE:
+        return str(PAGE_ID)
+
+    page = get_confluence_client().get_page_by_title(SPACE_KEY, page_title, expand="version")
+    if not page:
+        add_to_log(f"Page with title '{page_title}' not found in space '{SPACE_KEY}'")
+        return None
+    remember_confluence_page(page)
+    return page["id"]
+
+def flag_store_has_flags():
+    """
+    Checks whether the local flag store holds any flags yet.
+
+    Returns:
+        bool: True if the store is enabled and not empty.
+    """
+    if not FLAG_STORE_PATH or not os.path.exists(FLAG_STORE_PATH):
+        return False
+    with closing(open_flag_store()) as connection:
+        return connection.execute("SELECT 1 FROM flags LIMIT 1").fetchone() is not None
+
+def patch_flag_in_store(flag_name, environment, flag, fetched_at=None):
+    """
+    Updates a single flag in one environment of the local flag store.
+
+    The overall status of the flag is recomputed from all its environments. A flag that
+    no longer exists in the environment is marked "Deleted" there, keeping its details,
+    and "Deleted 🔴" overall once it is deleted everywhere. A stored owner is kept, as it
+    may have been edited on the page. The patch is skipped where
+    the store already holds a later fetch of the flag, e.g. from a full sync that
+    started after the flag was fetched.
+
+    Args:
+        flag_name (str): The name of the feature flag.
+        environment (str): The environment (repository column) to update.
+        flag (dict or None): The flag as returned by the GitLab API, or None if it was deleted.
+        fetched_at (float, optional): When the flag was fetched from GitLab, now if not given.
+    """
+    now = fetched_at or time.time()
+    with closing(open_flag_store()) as connection, connection:
+        if flag is None:
+            connection.execute(
+                "UPDATE flag_environments SET status = 'Deleted', updated_at = ? "
+                "WHERE name = ? AND environment = ? AND updated_at <= ?",
+                (now, flag_name, environment, now),
+            )
+        else:
+            connection.execute(
+                """
+                INSERT INTO flags (name, description, owned_by, status, first_seen_at, updated_at)
+                VALUES (?, ?, ?, '', ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    description = excluded.description,
+                    owned_by = COALESCE(NULLIF(flags.owned_by, ''), excluded.owned_by),
+                    updated_at = excluded.updated_at
+                WHERE flags.updated_at <= excluded.updated_at
+                """,
+                (flag_name, flag.get("description", ""), format_owned_by(flag), now, now),
+            )
+            cell = build_environment_cell(flag)
+            connection.execute(
+                """
+                INSERT INTO flag_environments (name, environment, status, details, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (name, environment) DO UPDATE SET
+                    status = excluded.status,
+                    details = excluded.details,
+                    updated_at = excluded.updated_at
+                WHERE flag_environments.updated_at <= excluded.updated_at
+                """,
+                (flag_name, environment, cell.status, json.dumps(cell.details, default=str), now),
+            )
+
+        statuses = {row[0] for row in connection.execute("SELECT status FROM flag_environments WHERE name = ?", (flag_name,))}
+        if not statuses:
+            return
+        if "Enabled" in statuses:
+            status = "In Use 🟢"
+        elif "Disabled" in statuses:
+            status = "Inactive ⚪"
+        else:
+            status = "Deleted 🔴"
+        connection.execute(
+            "UPDATE flags SET status = ?, updated_at = MAX(updated_at, ?) WHERE name = ?", (status, now, flag_name)
+        )
+    add_to_log(f"Patched flag '{flag_name}' in environment '{environment}' ({status}).")
 
 def fetch_existing_table_from_confluence(page_title):
     """
@@ -218,38 +1844,122 @@ def fetch_existing_table_from_confluence(page_title):
     Returns:
         tuple: A tuple containing the page ID (str) and the first table (pd.DataFrame) if it exists, or (None, None) if the page or table is not found.
     """
-    confluence = Confluence(url=CONFLUENCE_API_URL, username=EMAIL, password=CONFLUENCE_API_TOKEN)
-
-    # Fetch the page by its title
+    # Fetch the page with its body and version in one request
     add_to_log(f"Attempting to fetch page with title: {page_title}")
-    page = confluence.get_page_by_title(SPACE_KEY, page_title)
+    page = get_confluence_client().get_page_by_title(SPACE_KEY, page_title, expand="body.storage,version")
 
     if not page:
         add_to_log(f"Page with title '{page_title}' not found in space '{SPACE_KEY}'")
         return None, None
 
-    # Extract the page ID and fetch the page content
+    remember_confluence_page(page)
     page_id = page["id"]
-    add_to_log(f"Page found: ID {page_id}. Fetching content.")
-    page_content = confluence.get_page_by_id(page_id, expand="body.storage")["body"]["storage"]["value"]
+    add_to_log(f"Page found: ID {page_id}.")
+    page_content = page["body"]["storage"]["value"]
 
-    # Parse tables from the page content
-    add_to_log(f"Parsing tables from the content of page ID {page_id}")
-    tables = pd.read_html(io.StringIO(page_content))
+    # Parse the feature flag table from the page content
+    add_to_log(f"Parsing table from the content of page ID {page_id}")
+    table = parse_feature_flag_table(page_content)
 
-    # Log if no tables are found
-    if not tables:
+    # Log if no table is found
+    if table is None:
         add_to_log(f"No tables found on page ID {page_id}.")
         return page_id, None
 
     add_to_log(f"Table successfully fetched from page ID {page_id}")
-    return (page_id, tables[0])  # Return the page ID and the first table
+    return (page_id, table)  # Return the page ID and the first table
+
+def merge_page_owner_edits(table, snapshot):
+    """
+    Takes the "Owned by" values edited by hand on the published pages into the table.
+
+    Only pages whose version differs from the one left by the last publish (the snapshot's
+    "page_versions") were edited, so only those are downloaded and parsed. Their new
+    versions are recorded in the snapshot, so they are not read again. Pages without a
+    flag table, such as the index page in "sharded" mode, are skipped.
+
+    Args:
+        table (pd.DataFrame): The table to update in place.
+        snapshot (dict): The snapshot returned by load_snapshot(), updated in place.
+
+    Returns:
+        int: The number of owners that changed.
+    """
+    owners = {}
+    page_versions = snapshot.get("page_versions", {})
+    for title, version in list(page_versions.items()):
+        page = get_confluence_client().get_page_by_title(SPACE_KEY, title, expand="version")
+        if not page or page["version"]["number"] == version:
+            continue
+        add_to_log(f"Page '{title}' was edited since the last publish, reading its owners.")
+        _, page_table = fetch_existing_table_from_confluence(title)
+        page_versions[title] = page["version"]["number"]
+        if page_table is None or not {"Feature toggle name", "Owned by"}.issubset(page_table.columns):
+            add_to_log(f"Page '{title}' has no feature flag table, skipping it.")
+            continue
+        owners.update(zip(page_table["Feature toggle name"], page_table["Owned by"]))
+    if not owners:
+        return 0
+
+    edited_owners = table["Feature toggle name"].map(owners)
+    changed = edited_owners.notna() & (edited_owners != table["Owned by"])
+    table.loc[changed, "Owned by"] = edited_owners[changed]
+    add_to_log(f"Kept {changed.sum()} owners edited on the page.")
+    return int(changed.sum())
+
+def get_deleted_state(cell):
+    """
+    Returns the cell of a flag deleted from GitLab, keeping the details it had.
+
+    Args:
+        cell (EnvironmentState or any): A repository cell of the table.
+
+    Returns:
+        EnvironmentState or str: The state with status "Deleted", or "Deleted" for cells without details.
+    """
+    if isinstance(cell, EnvironmentState):
+        return get_environment_state("Deleted", cell.details)
+    return "Deleted"
+
+def append_deleted_flags(existing_table, new_table):
+    """
+    Appends flags that exist only in the existing table to the new table, marked as deleted.
+
+    Deleted flags are found with a single anti-join on "Feature toggle name" and appended
+    with one concat, keeping their description, ownership and history. Every environment
+    of a deleted flag is marked "Deleted", with the details it had there.
+
+    Args:
+        existing_table (pd.DataFrame): The current table containing existing data.
+        new_table (pd.DataFrame): The table with the freshly fetched flags.
+
+    Returns:
+        pd.DataFrame: The new table followed by the deleted flags.
+    """
+    deleted_mask = ~existing_table["Feature toggle name"].isin(new_table["Feature toggle name"])
+    if not deleted_mask.any():
+        return new_table
+
+    deleted_flags = existing_table.loc[deleted_mask].copy()
+    deleted_flags["Status"] = "Deleted 🔴"
+    for column in deleted_flags.columns.difference(BASE_COLUMNS):
+        deleted_flags[column] = deleted_flags[column].map(get_deleted_state)
+    for repo_url, _ in REPOSITORY_MAP:
+        if repo_url not in deleted_flags.columns:
+            deleted_flags[repo_url] = "Deleted"
+
+    add_to_log(f"Marked {len(deleted_flags)} flags missing from GitLab as deleted.")
+    return _pd().concat([new_table, deleted_flags.astype(object)], ignore_index=True)
 
 def update_table(existing_table, new_table):
     """
     Updates the existing table with new data from the new table.
 
     Both tables are expected to have "Feature toggle name" as a unique identifier.
+    Repository columns of the flags in the new table are taken from the new table only,
+    so a flag that is gone from an environment is shown as not available there.
+    Owners can be edited by hand on the page, so a non-empty "Owned by" of the existing
+    table is kept; an empty one is derived from GitLab again.
 
     Args:
         existing_table (pd.DataFrame): The current table containing existing data.
@@ -267,128 +1977,206 @@ def update_table(existing_table, new_table):
 
     # Merge the new table into the existing table
     add_to_log("Merging new table data into the existing table.")
-    merged_table = new_table.combine_first(existing_table).reset_index()
+    merged_table = new_table.combine_first(existing_table)
+    environment_columns = [column for column in merged_table.columns if column not in BASE_COLUMNS]
+    merged_table.loc[new_table.index, environment_columns] = new_table.reindex(columns=environment_columns)
+    existing_owners = existing_table["Owned by"].reindex(merged_table.index)
+    kept_owners = existing_owners.notna() & (existing_owners != "")
+    merged_table.loc[kept_owners, "Owned by"] = existing_owners[kept_owners]
+    merged_table = merged_table.reset_index()
 
     add_to_log("Table merge completed successfully.")
     return merged_table
 
-def upload_table_to_confluence(html_content, page_id=None):
+def check_page_size(html_content, title=PAGE_TITLE):
+    """
+    Measures a page body and checks it against PAGE_SIZE_BUDGET.
+
+    Args:
+        html_content (str): The page body.
+        title (str): The title of the page, for the error message.
+
+    Returns:
+        int: The size of the body in bytes.
+
+    Raises:
+        RuntimeError: If the body is larger than PAGE_SIZE_BUDGET.
+    """
+    size = len(html_content.encode("utf-8"))
+    if PAGE_SIZE_BUDGET and size > PAGE_SIZE_BUDGET:
+        raise RuntimeError(
+            f"Body of page '{title}' is {size} bytes, over the PAGE_SIZE_BUDGET of {PAGE_SIZE_BUDGET} bytes. "
+            'Consider PAGE_FORMAT = "compact", RUN_LOG_TARGET = "attachment" or PUBLISH_MODE = "sharded".'
+        )
+    return size
+
+def upload_table_to_confluence(html_content, page_id=None, title=PAGE_TITLE, parent_id=None):
     """
     Uploads an HTML table to Confluence by creating or updating a page.
 
-    If a `page_id` is provided, the function updates the existing page.
-    Otherwise, it creates a new page in the specified Confluence space.
+    If a `page_id` is provided, the function updates the existing page with a single PUT
+    of the next version, using the version cached by earlier lookups and uploads. If the
+    page was edited in the meantime (HTTP 409), the version is looked up again and the
+    update retried once. A page that no longer exists (HTTP 404) is dropped from the cache
+    of page IDs, so the next sync looks its title up again. Otherwise, it creates a new
+    page in the specified Confluence space.
 
     Args:
         html_content (str): The HTML content of the table to upload.
         page_id (str, optional): The ID of the Confluence page to update. If None, a new page will be created.
+        title (str): The title of the page.
+        parent_id (str, optional): The ID of the parent page when a new page is created.
+
+    Returns:
+        str: The ID of the updated or created page.
+
+    Raises:
+        RuntimeError: If the body is larger than PAGE_SIZE_BUDGET, see check_page_size().
+        requests.HTTPError: If the update failed, other than a single version conflict.
+    """
+    size = page_bytes[title] = check_page_size(html_content, title)
+    confluence = get_confluence_client()
+
+    if page_id:
+        add_to_log(f"Updating existing page with ID: {page_id}.")
+        cached = confluence_pages.get(title)
+        version = cached["version"] if cached and cached["id"] == page_id else None
+        for attempt in range(2):
+            try:
+                if version is None:
+                    version = confluence.get(f"rest/api/content/{page_id}", params={"expand": "version"})["version"]["number"]
+                page = confluence.put(f"rest/api/content/{page_id}", data={
+                    "id": page_id,
+                    "type": "page",
+                    "title": title,
+                    "version": {"number": version + 1, "minorEdit": False},
+                    "body": {"storage": {"value": html_content, "representation": "storage"}},
+                })
+                increment_metric("bytes_uploaded_total", size)
+                break
+            except requests.HTTPError as e:
+                # The cached ID or version is stale, the next lookup asks Confluence again
+                confluence_pages.pop(title, None)
+                if e.response is not None and e.response.status_code == 404:
+                    add_to_log(f"Page with ID {page_id} was not found, its cached ID was dropped.", logging.WARNING)
+                if attempt or e.response is None or e.response.status_code != 409:
+                    raise
+                add_to_log(f"Page with ID {page_id} was changed since version {version}, retrying.", logging.WARNING)
+                version = None
+        remember_confluence_page(page)
+        add_to_log(f"Page with ID {page_id} successfully updated.")
+        return page_id
+
+    add_to_log(f"Creating a new page titled '{title}' in space '{SPACE_KEY}'.")
+    page = confluence.create_page(space=SPACE_KEY, title=title, body=html_content, parent_id=parent_id)
+    increment_metric("bytes_uploaded_total", size)
+    remember_confluence_page(page)
+    add_to_log(f"New page titled '{title}' successfully created.")
+    return page["id"]
+
+def compute_row_hashes(table):
+    """
+    Computes a content hash for every row of the table.
+
+    Args:
+        table (pd.DataFrame): The table to hash, with "Feature toggle name" as a column.
+
+    Returns:
+        dict: A mapping of feature toggle name to the SHA-1 hash of its row.
+    """
+    columns = list(table.columns)
+    name_index = columns.index("Feature toggle name")
+    row_hashes = {}
+    for row in table.itertuples(index=False, name=None):
+        payload = json.dumps(dict(zip(columns, row)), sort_keys=True, default=json_default, ensure_ascii=False)
+        row_hashes[row[name_index]] = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return row_hashes
+
+def load_snapshot():
+    """
+    Loads the snapshot of the last published table.
+
+    Returns:
+        dict: The snapshot with "columns", the PAGE_FORMAT of the rows ("format"), "rows" (feature
+            toggle name to {"hash", "html"}), the "drift" report hash, the body bytes per page
+            title ("page_bytes"), the layout (see get_publish_layout()), the published
+            "shards" and the version of every published page ("page_versions"), empty if
+            none exists.
+    """
+    if not SNAPSHOT_PATH:
+        return {"columns": [], "rows": {}}
+    try:
+        with open(SNAPSHOT_PATH) as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return {"columns": [], "rows": {}}
 
-    Returns:
-        None
+def save_snapshot(columns, row_hashes, row_cache, drift_hash=None, body_sizes=None, shards=None, page_versions=None):
     """
-    add_to_log("Initializing Confluence API connection.")
-    confluence = Confluence(url=CONFLUENCE_API_URL, username=EMAIL, password=CONFLUENCE_API_TOKEN)
+    Saves the snapshot of the published table.
 
-    if page_id:
-        add_to_log(f"Updating existing page with ID: {page_id}.")
-        confluence.update_page(page_id=page_id, title=PAGE_TITLE, body=html_content)
-        add_to_log(f"Page with ID {page_id} successfully updated.")
-    else:
-        add_to_log(f"Creating a new page titled '{PAGE_TITLE}' in space '{SPACE_KEY}'.")
-        confluence.create_page(space=SPACE_KEY, title=PAGE_TITLE, body=html_content)
-        add_to_log(f"New page titled '{PAGE_TITLE}' successfully created.")
+    Args:
+        columns (list): The columns of the published table.
+        row_hashes (dict): The row hashes keyed by feature toggle name.
+        row_cache (dict): The rendered row HTML keyed by feature toggle name, in PAGE_FORMAT.
+        drift_hash (str, optional): The hash of the published drift report section, if any.
+        body_sizes (dict, optional): The body bytes of every published page, keyed by title.
+        shards (list, optional): The shards published in "sharded" mode.
+        page_versions (dict, optional): The version every published page was left at, keyed by title.
+    """
+    if not SNAPSHOT_PATH:
+        return
+    snapshot = {
+        "columns": columns,
+        "format": PAGE_FORMAT,
+        "rows": {name: {"hash": row_hash, "html": row_cache[name]} for name, row_hash in row_hashes.items()},
+        "drift": drift_hash,
+        "page_bytes": body_sizes or {},
+        **get_publish_layout(),
+        "shards": shards or [],
+        "page_versions": page_versions or {},
+    }
+    tmp_path = f"{SNAPSHOT_PATH}.tmp"
+    with open(tmp_path, "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file, ensure_ascii=False)
+    os.replace(tmp_path, SNAPSHOT_PATH)
 
-def generate_html_with_icons_and_dropdown(table):
+def diff_snapshot(snapshot, columns, row_hashes):
     """
-    Generates an HTML table with status icons and expandable dropdowns for detailed information.
+    Compares the table about to be published with the last published snapshot.
+
+    A change in the column set or in PAGE_FORMAT marks every row as changed, since every row
+    must be re-rendered.
 
     Args:
-        table (DataFrame): The input table containing feature flags and their details.
+        snapshot (dict): The snapshot returned by load_snapshot().
+        columns (list): The columns of the new table.
+        row_hashes (dict): The row hashes of the new table.
 
     Returns:
-        str: The HTML representation of the table with icons and dropdowns.
+        dict: Lists of feature toggle names under "added", "changed" and "deleted".
     """
-    # Mapping status values to their respective icons
-    status_icons = {
-        "Enabled": '<span style="color: green;">&#x2714;</span>',  # Green check mark
-        "Disabled": '<span style="color: red;">&#x2716;</span>',   # Red cross
-        "Not Available": '<span style="color: gray;">&#x25CB;</span>',  # Gray circle
-        "Deleted": '<span style="color: orange;">&#x1F5D1;</span>',  # Orange trash bin
+    old_rows = snapshot["rows"]
+    columns_changed = snapshot["columns"] != columns or snapshot.get("format", "inline") != PAGE_FORMAT
+    return {
+        "added": [name for name in row_hashes if name not in old_rows],
+        "changed": [
+            name for name, row_hash in row_hashes.items()
+            if name in old_rows and (columns_changed or old_rows[name]["hash"] != row_hash)
+        ],
+        "deleted": [name for name in old_rows if name not in row_hashes],
     }
 
-    def should_show_dropdown(details):
-        """
-        Determines whether to show the dropdown for a given cell.
-        
-        Args:
-            details (dict): The details object containing strategies and scopes.
-        
-        Returns:
-            bool: True if dropdown should be shown, False otherwise.
-        """
-        strategies = details.get("strategies", [])
-        if not strategies:  # Empty strategies
-            return False
-        
-        for strategy in strategies:
-            # Check if all strategies are "default" with "environment_scope = *"
-            if strategy.get("name") != "default" or not all(
-                scope.get("environment_scope") == "*" for scope in strategy.get("scopes", [])
-            ):
-                return True
-        return False
+# Mapping status values to their respective icons
+STATUS_ICONS = {
+    "Enabled": '<span style="color: green;">&#x2714;</span>',  # Green check mark
+    "Disabled": '<span style="color: red;">&#x2716;</span>',   # Red cross
+    "Not Available": '<span style="color: gray;">&#x25CB;</span>',  # Gray circle
+    "Deleted": '<span style="color: orange;">&#x1F5D1;</span>',  # Orange trash bin
+}
 
-    def format_cell(cell):
-        """
-        Formats the cell with status icons and dropdowns.
-        """
-        if not isinstance(cell, dict):
-            # Return "Not Available" with gray icon if cell is not a dictionary
-            return f'{status_icons["Not Available"]}'
-        
-        status = cell.get("status", "Not Available")
-        icon = status_icons.get(status, status_icons["Not Available"])
-        
-        if should_show_dropdown(cell.get("details", {})):
-            dropdown = (
-                f'<ac:structured-macro ac:name="expand" ac:schema-version="1">'
-                f'<ac:parameter ac:name="title" style="max-width: 200px;">Show scope</ac:parameter>'
-                f'<ac:rich-text-body>'
-                f'<pre style="max-width: 200px; overflow: scroll; font-family: monospace; white-space: pre-wrap; word-wrap: break-word; background: #f9f9f9; padding: 10px; border-radius: 4px; border: 1px solid #ddd;">'
-                f'{format_details(cell.get("details", {}))}'
-                f'</pre>'
-                f'</ac:rich-text-body>'
-                f'</ac:structured-macro>'
-            )
-            return icon + dropdown
-        
-        return f'{icon}'
-
-    # Process statuses in the table
-    table = table.copy()
-    for column in table.columns:
-        if column not in ["Feature toggle name", "Feature description", "Owned by", "Status"]:
-            table[column] = table[column].map(format_cell)
-
-    # Generate HTML for the table
-    table_html = f"""
-    <table style="width: 100%; border-collapse: collapse; font-size: 14px; font-family: Arial, sans-serif;">
-        <thead>
-            <tr>
-                {''.join(f'<th style="border: 1px solid #ddd; padding: 10px; background-color: #f4f4f4;">{col}</th>' for col in table.columns)}
-            </tr>
-        </thead>
-        <tbody>
-            {''.join(
-                '<tr>' +
-                ''.join(f'<td style="border: 1px solid #ddd; padding: 10px; text-align: left; vertical-align: top;">{format_user_ids(cell) if column == "userIds" else cell}</td>' for column, cell in zip(table.columns, row)) +
-                '</tr>'
-                for row in table.values
-            )}
-        </tbody>
-    </table>
-    """
-    style = """
+# Static HTML fragments of the feature flag table, built once at import
+TABLE_STYLE = """
     <style>
         table {
             width: 100%;
@@ -426,75 +2214,528 @@ def generate_html_with_icons_and_dropdown(table):
         }
     </style>
     """
-    return style + table_html
+TABLE_OPEN = '<table style="width: 100%; border-collapse: collapse; font-size: 14px; font-family: Arial, sans-serif;">'
+TH_OPEN = '<th style="border: 1px solid #ddd; padding: 10px; background-color: #f4f4f4;">'
+TD_OPEN = '<td style="border: 1px solid #ddd; padding: 10px; text-align: left; vertical-align: top;">'
+DROPDOWN_OPEN = (
+    '<ac:structured-macro ac:name="expand" ac:schema-version="1">'
+    '<ac:parameter ac:name="title" style="max-width: 200px;">Show scope</ac:parameter>'
+    '<ac:rich-text-body>'
+    '<pre style="max-width: 200px; overflow: scroll; font-family: monospace; white-space: pre-wrap; word-wrap: break-word; background: #f9f9f9; padding: 10px; border-radius: 4px; border: 1px solid #ddd;">'
+)
+DROPDOWN_CLOSE = '</pre></ac:rich-text-body></ac:structured-macro>'
+COMPACT_TABLE_STYLE = (
+    "<style>"
+    ".ff{width:100%;border-collapse:collapse;margin:20px 0;font-size:14px;font-family:Arial,sans-serif}"
+    ".ff th,.ff td{border:1px solid #ddd;padding:10px;text-align:left;vertical-align:top}"
+    ".ff th{background-color:#f4f4f4;color:#333}"
+    ".ff tr:nth-child(even){background-color:#f9f9f9}"
+    ".ff pre{max-width:200px;max-height:200px;overflow:auto;font-family:monospace;white-space:pre-wrap;"
+    "word-wrap:break-word;background:#f9f9f9;padding:10px;border-radius:4px;border:1px solid #ddd}"
+    ".ff .on{color:green}.ff .off{color:red}.ff .na{color:gray}.ff .del{color:orange}"
+    "</style>"
+)
+# Markup per PAGE_FORMAT. "compact" leaves the styling to COMPACT_TABLE_STYLE, so cells carry no attributes.
+PAGE_FORMATS = {
+    "inline": {
+        "style": TABLE_STYLE,
+        "table": TABLE_OPEN,
+        "th": TH_OPEN,
+        "td": TD_OPEN,
+        "dropdown": DROPDOWN_OPEN,
+        "icons": STATUS_ICONS,
+        "log_message": "<div style='margin-bottom: 5px;'>",
+    },
+    "compact": {
+        "style": COMPACT_TABLE_STYLE,
+        "table": '<table class="ff">',
+        "th": "<th>",
+        "td": "<td>",
+        "dropdown": (
+            '<ac:structured-macro ac:name="expand" ac:schema-version="1">'
+            '<ac:parameter ac:name="title">Show scope</ac:parameter><ac:rich-text-body><pre>'
+        ),
+        "icons": {
+            "Enabled": '<span class="on">&#x2714;</span>',
+            "Disabled": '<span class="off">&#x2716;</span>',
+            "Not Available": '<span class="na">&#x25CB;</span>',
+            "Deleted": '<span class="del">&#x1F5D1;</span>',
+        },
+        "log_message": "<div>",
+    },
+}
+
+def escape_html(value, quote=False):
+    """
+    Escapes a value for use as HTML text.
+
+    Non-ASCII characters (such as the status emoji) become numeric character references,
+    which keeps the rendered page pure ASCII and its strings at one byte per character.
+
+    Args:
+        value (any): The value to escape, converted to a string first.
+        quote (bool): Also escape quotes, for use in an attribute value.
+
+    Returns:
+        str: The escaped text.
+    """
+    text = html.escape(str(value), quote=quote)
+    return text if text.isascii() else text.encode("ascii", "xmlcharrefreplace").decode("ascii")
+
+def should_show_dropdown(details):
+    """
+    Determines whether to show the dropdown for a given cell.
+
+    Args:
+        details (dict): The details object containing strategies and scopes.
+
+    Returns:
+        bool: True if dropdown should be shown, False otherwise.
+    """
+    strategies = details.get("strategies", [])
+    if not strategies:  # Empty strategies
+        return False
+
+    for strategy in strategies:
+        # Check if all strategies are "default" with "environment_scope = *"
+        if strategy.get("name") != "default" or not all(
+            scope.get("environment_scope") == "*" for scope in strategy.get("scopes", [])
+        ):
+            return True
+    return False
+
+def format_cell(cell):
+    """
+    Formats a repository cell with its status icon and, if needed, a details dropdown.
+
+    Args:
+        cell (EnvironmentState or any): The state of the flag in the environment.
+
+    Returns:
+        str: The HTML of the cell content.
+    """
+    icons = PAGE_FORMATS[PAGE_FORMAT]["icons"]
+    if not isinstance(cell, EnvironmentState):
+        # Return "Not Available" with gray icon if cell has no state
+        return icons["Not Available"]
+
+    icon = icons.get(cell.status, icons["Not Available"])
+    return icon + render_details_dropdown(cell.shape, cell.ids, cell.key)
+
+def render_details_dropdown(shape, ids=(), key=None):
+    """
+    Renders the details dropdown of a cell, memoized by the shape of the details.
+
+    Most flags share a few strategy and scope shapes, which differ only in their
+    per-project IDs. Each shape is rendered once with a placeholder per ID, and the
+    resulting template is kept in a least-recently-used cache of DETAILS_CACHE_SIZE
+    entries, keyed by PAGE_FORMAT and a canonical hash of the shape. The cell's IDs
+    are then filled into the template.
+
+    Args:
+        shape (dict): The details with their IDs set to None, see split_details_ids().
+        ids (tuple): The IDs of the cell, in the order of split_details_ids().
+        key (bytes, optional): The canonical hash of the shape, computed if not given.
+
+    Returns:
+        str: The dropdown HTML, or an empty string if no dropdown should be shown.
+    """
+    if key is None:
+        key = canonical_hash(shape)
+    key = (PAGE_FORMAT, key)
+    template = details_cache.get(key)
+    if template is not None:
+        details_cache.move_to_end(key)
+        details_cache_stats["hits"] += 1
+    else:
+        details_cache_stats["misses"] += 1
+        template = build_dropdown_template(shape)
+        details_cache[key] = template
+        if len(details_cache) > DETAILS_CACHE_SIZE:
+            details_cache.popitem(last=False)
+
+    if len(template) == 1:
+        return template[0]
+    chunks = [template[0]]
+    for index in range(1, len(template), 2):
+        chunks.append(escape_html(ids[template[index]]))
+        chunks.append(template[index + 1])
+    return "".join(chunks)
+
+def build_dropdown_template(shape):
+    """
+    Renders the dropdown of a details shape with a placeholder for each of its IDs.
+
+    Args:
+        shape (dict): The details with their IDs set to None.
+
+    Returns:
+        list: The HTML split at the placeholders. Even items are HTML, odd items are the
+            positions (int) of the IDs that go between them.
+    """
+    if not should_show_dropdown(shape):
+        return [""]
+    _, ids = split_details_ids(shape)
+    placeholders = [DETAILS_ID_PLACEHOLDER.format(index) for index in range(len(ids))]
+    details_html = format_details(join_details_ids(shape, placeholders))
+    template = DETAILS_ID_PLACEHOLDER_PATTERN.split(PAGE_FORMATS[PAGE_FORMAT]["dropdown"] + details_html + DROPDOWN_CLOSE)
+    template[1::2] = map(int, template[1::2])
+    return template
+
+def iter_rendered_rows(table, row_cache):
+    """
+    Renders the table rows one at a time.
+
+    Every row is rendered through a single template built from the table's columns.
+    Rows found in the cache are yielded as-is; rendered rows are added to it.
+
+    Args:
+        table (pd.DataFrame): The table containing feature flags and their details.
+        row_cache (dict): Rendered "<tr>" HTML keyed by feature toggle name.
+
+    Yields:
+        str: The HTML of each row, in table order.
+    """
+    columns = list(table.columns)
+    name_index = columns.index("Feature toggle name")
+    row_template = "<tr>" + (PAGE_FORMATS[PAGE_FORMAT]["td"] + "{}</td>") * len(columns) + "</tr>"
+
+    formatters = []
+    for column in columns:
+        if column == "userIds":
+            formatters.append(lambda cell: format_user_ids(format_cell(cell)))
+        elif column in BASE_COLUMNS:
+            formatters.append(escape_html)
+        else:
+            formatters.append(format_cell)
+
+    for row in table.itertuples(index=False, name=None):
+        row_html = row_cache.get(row[name_index])
+        if row_html is None:
+            row_html = row_template.format(*[formatter(cell) for formatter, cell in zip(formatters, row)])
+            row_cache[row[name_index]] = row_html
+        yield row_html
+
+def get_render_config():
+    """Returns the current values of the RENDER_CONFIG settings."""
+    return {name: globals()[name] for name in RENDER_CONFIG}
+
+def apply_render_config(config):
+    """
+    Sets the render settings of a worker process, see get_render_pool().
+
+    Args:
+        config (dict): The settings returned by get_render_config() in the parent process.
+    """
+    globals().update(config)
+
+def get_render_pool():
+    """
+    Returns the shared pool of RENDER_PROCESSES row rendering processes, creating it on first use.
+
+    Workers are spawned rather than forked, since the Flask app and sync worker run threads.
+    A spawned worker imports main.py afresh, so the RENDER_CONFIG settings of this process
+    are passed to its initializer. The pool is restarted when they or RENDER_PROCESSES change.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    global render_pool, render_pool_config
+    config = get_render_config()
+    if render_pool is not None and render_pool_config != (RENDER_PROCESSES, config):
+        render_pool.shutdown()
+        render_pool = None
+    if render_pool is None:
+        render_pool = ProcessPoolExecutor(
+            RENDER_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+            initializer=apply_render_config, initargs=(config,),
+        )
+        render_pool_config = (RENDER_PROCESSES, config)
+    return render_pool
+
+def render_rows_partition(columns, rows):
+    """
+    Renders a partition of table rows in a worker process.
+
+    Args:
+        columns (list): The columns of the table.
+        rows (list): The rows to render, as tuples in column order.
+
+    Returns:
+        tuple: The rendered "<tr>" HTML keyed by feature toggle name, and the details cache hits and misses.
+    """
+    details_cache_stats["hits"] = details_cache_stats["misses"] = 0
+    row_cache = {}
+    for _ in iter_rendered_rows(_pd().DataFrame(rows, columns=columns), row_cache):
+        pass
+    return row_cache, details_cache_stats["hits"], details_cache_stats["misses"]
+
+def render_rows_in_processes(table, row_cache):
+    """
+    Renders the rows missing from the cache in the render pool and adds them to the cache.
+
+    Rows are partitioned by a hash of their feature toggle name, one partition per process.
+    The caller then assembles the page from the cache in table order.
+
+    Args:
+        table (pd.DataFrame): The table containing feature flags and their details.
+        row_cache (dict): Rendered "<tr>" HTML keyed by feature toggle name.
+    """
+    columns = list(table.columns)
+    name_index = columns.index("Feature toggle name")
+    partitions = [[] for _ in range(RENDER_PROCESSES)]
+    for row in table.itertuples(index=False, name=None):
+        if row[name_index] not in row_cache:
+            partitions[zlib.crc32(row[name_index].encode("utf-8")) % RENDER_PROCESSES].append(row)
+
+    pool = get_render_pool()
+    futures = [pool.submit(render_rows_partition, columns, rows) for rows in partitions if rows]
+    for future in futures:
+        rendered, hits, misses = future.result()
+        row_cache.update(rendered)
+        details_cache_stats["hits"] += hits
+        details_cache_stats["misses"] += misses
+    add_to_log(f"Rendered {sum(map(len, partitions))} rows in {len(futures)} processes.")
+
+def generate_html_with_icons_and_dropdown(table, row_cache=None):
+    """
+    Generates an HTML table with status icons and expandable dropdowns for detailed information.
+
+    The page is assembled from precomputed fragments and the rendered rows in a single join.
+    With RENDER_PROCESSES set and at least RENDER_PROCESSES_MIN_ROWS rows to render, the
+    rows are rendered in worker processes first, see render_rows_in_processes().
+
+    Args:
+        table (DataFrame): The input table containing feature flags and their details.
+        row_cache (dict, optional): Rendered "<tr>" HTML keyed by feature toggle name. Rows found in it
+            are reused as-is; rows rendered by this call are added to it.
+
+    Returns:
+        str: The HTML representation of the table with icons and dropdowns.
+    """
+    if row_cache is None:
+        row_cache = {}
+    details_cache_stats["hits"] = details_cache_stats["misses"] = 0
+    if RENDER_PROCESSES > 1 and (~table["Feature toggle name"].isin(row_cache)).sum() >= RENDER_PROCESSES_MIN_ROWS:
+        render_rows_in_processes(table, row_cache)
+
+    fragments = PAGE_FORMATS[PAGE_FORMAT]
+    chunks = [fragments["style"], fragments["table"], "<thead><tr>"]
+    chunks.extend(f"{fragments['th']}{escape_html(column)}</th>" for column in table.columns)
+    chunks.append("</tr></thead><tbody>")
+    chunks.extend(iter_rendered_rows(table, row_cache))
+    chunks.append("</tbody></table>")
+
+    lookups = details_cache_stats["hits"] + details_cache_stats["misses"]
+    if lookups:
+        add_to_log(
+            f"Details cache: {details_cache_stats['hits']} hits, {details_cache_stats['misses']} misses "
+            f"({details_cache_stats['hits'] / lookups:.0%} hit rate)."
+        )
+    return "".join(chunks)
 
 def format_user_ids(user_ids):
     """
-    Formats a list of user IDs into a string with each ID on a new line.
+    Formats user IDs for the page, truncated to USER_IDS_PREVIEW IDs.
 
     Args:
-        user_ids (list or any): The user IDs to format, expected to be a list.
+        user_ids (dict, list or any): A reference built by make_user_ids_reference(), a list of IDs, or a single ID.
 
     Returns:
-        str: A formatted string with user IDs separated by line breaks, or a single ID as a string.
+        str: The escaped IDs separated by commas, followed by "(N more)" if some were left out.
     """
-    # Check if user_ids is a list
-    if isinstance(user_ids, list):
-        # Log the number of user IDs being formatted
-        add_to_log(f"Formatting {len(user_ids)} user IDs.")
-        return "<br>".join(map(str, user_ids))  # Join user IDs with line breaks
-    # Log that a single user ID is being returned
-    add_to_log(f"Returning single user ID: {user_ids}")
-    return str(user_ids)  # Convert single ID to string
+    if is_user_ids_reference(user_ids):
+        preview, count = user_ids["preview"], user_ids["count"]
+    elif isinstance(user_ids, list):
+        preview, count = user_ids[:USER_IDS_PREVIEW], len(user_ids)
+    else:
+        return str(user_ids)
+
+    text = ", ".join(map(escape_html, preview))
+    if count > len(preview):
+        text += f" ({count - len(preview)} more)"
+    return text
 
 def format_details(details):
     """
     Formats a JSON-like structure (dictionary or list) into an HTML representation.
 
+    With the "compact" PAGE_FORMAT, a value that starts on the line of its key or list
+    marker is not indented, as the indentation only shows on the following lines.
+
     Args:
         details (dict or list): The details to format, expected to be a dictionary or a list.
 
     Returns:
         str: A formatted HTML string representing the details.
     """
-    
-    def json_to_html(data, level=0):
+    chunks = []
+    compact = PAGE_FORMAT == "compact"
+
+    def json_to_html(data, level=0, same_line=False):
         """
-        Recursively converts a JSON object into HTML.
+        Recursively appends the HTML of a JSON object to the chunks.
 
         Args:
             data (dict or list): The JSON data to convert.
             level (int): The current indentation level for nested structures.
-
-        Returns:
-            str: The HTML representation of the JSON data.
+            same_line (bool): Whether the data starts on the line of its key or list marker.
         """
-        html = ""
         indent = "&nbsp;" * (level * 4)  # Create indentation for nested elements
-        if isinstance(data, dict):
-            for key, value in data.items():
-                html += f"{indent}<strong>{key}:</strong> {json_to_html(value, level + 1)}<br>"
+        first_indent = "" if compact and same_line else indent
+        if is_user_ids_reference(data):
+            chunks.append(first_indent + format_user_ids(data))
+        elif isinstance(data, dict):
+            for index, (key, value) in enumerate(data.items()):
+                chunks.append(f"{indent if index else first_indent}<strong>{escape_html(key)}:</strong> ")
+                json_to_html(value, level + 1, True)
+                chunks.append("<br>")
         elif isinstance(data, list):
-            for item in data:
-                html += f"{indent}- {json_to_html(item, level + 1)}<br>"
+            for index, item in enumerate(data):
+                chunks.append(f"{indent if index else first_indent}- ")
+                json_to_html(item, level + 1, True)
+                chunks.append("<br>")
         else:
-            html += f"{indent}{str(data)}"  # Convert non-dict/list data to string
-        return html
-    
-    return json_to_html(details)  # Call the recursive function to convert details to HTML
+            chunks.append(first_indent + escape_html(data))  # Convert non-dict/list data to string
+
+    json_to_html(details)  # Call the recursive function to convert details to HTML
+    return "".join(chunks)
 
 def generate_log_html():
-    """Generates HTML for log messages."""
+    """
+    Generates HTML for the log messages of the current run.
+
+    With LOG_HTML_SUMMARY_ONLY, only the message counts, warnings, errors and the last
+    message are included.
+    """
     if not global_log:
         return "<div>No log messages available.</div>"
-    
-    log_html = "<div style='margin: 20px 0; padding: 10px; border: 1px solid #ccc; background-color: #f9f9f9;'>"
-    log_html += "<strong>Stack trace:</strong><br>"
-    for message in global_log:
-        log_html += f"<div style='margin-bottom: 5px;'>{message}</div>"
-    log_html += "</div>"
-    
-    return log_html
+
+    total = sum(log_level_counts.values())
+    chunks = ["<div style='margin: 20px 0; padding: 10px; border: 1px solid #ccc; background-color: #f9f9f9;'>"]
+    if LOG_HTML_SUMMARY_ONLY:
+        counts = ", ".join(
+            f"{count} {logging.getLevelName(level).lower()}" for level, count in sorted(log_level_counts.items())
+        )
+        chunks.append(f"<strong>Log summary:</strong> {total} messages ({counts})<br>")
+        messages = [message for level, message in global_log if level >= logging.WARNING]
+        if global_log[-1][0] < logging.WARNING:
+            messages.append(global_log[-1][1])
+    else:
+        chunks.append("<strong>Stack trace:</strong><br>")
+        if total > len(global_log):
+            chunks.append(f"<div style='margin-bottom: 5px;'>(showing the last {len(global_log)} of {total} messages)</div>")
+        messages = [message for _, message in global_log]
+    message_open = PAGE_FORMATS[PAGE_FORMAT]["log_message"]
+    for message in messages:
+        chunks.append(f"{message_open}{escape_html(message)}</div>")
+    chunks.append("</div>")
+
+    return "".join(chunks)
+
+def generate_log_text():
+    """Returns the log messages of the current run as plain text, one "LEVEL message" line each."""
+    return "".join(f"{logging.getLevelName(level)} {message}\n" for level, message in global_log)
+
+def get_run_log_title():
+    """Returns the title of the run log child page."""
+    return f"{PAGE_TITLE} - Run log"
+
+def generate_log_section():
+    """
+    Generates the run log block of the main page.
+
+    Returns:
+        str: The run log itself when RUN_LOG_TARGET is "page", otherwise a link to the
+            attachment or child page that publish_run_log() writes, with the message counts.
+    """
+    if RUN_LOG_TARGET == "page":
+        return generate_log_html()
+    if RUN_LOG_TARGET == "attachment":
+        target = f'<ri:attachment ri:filename="{escape_html(RUN_LOG_ATTACHMENT, quote=True)}" />'
+    else:
+        target = f'<ri:page ri:content-title="{escape_html(get_run_log_title(), quote=True)}" />'
+    counts = ", ".join(
+        f"{count} {logging.getLevelName(level).lower()}" for level, count in sorted(log_level_counts.items())
+    )
+    return f"<p><strong>Run log:</strong> <ac:link>{target}</ac:link> ({sum(log_level_counts.values())} messages{', ' + counts if counts else ''})</p>"
+
+def render_run_log_page():
+    """
+    Renders the body of the run log child page.
+
+    Returns:
+        dict: The body keyed by the page title when RUN_LOG_TARGET is "child", otherwise empty.
+    """
+    return {get_run_log_title(): generate_log_html()} if RUN_LOG_TARGET == "child" else {}
+
+def check_page_sizes(bodies):
+    """
+    Checks every page body of a publish against PAGE_SIZE_BUDGET before the first upload,
+    so a body over the budget fails the sync before any page is changed.
+
+    Args:
+        bodies (dict): The page bodies keyed by page title.
+
+    Raises:
+        RuntimeError: If a body is larger than PAGE_SIZE_BUDGET, see check_page_size().
+    """
+    for title, html_content in bodies.items():
+        check_page_size(html_content, title)
+
+def publish_run_log(page_id, log_pages=None):
+    """
+    Publishes the run log next to a page, as an attachment or a child page depending on RUN_LOG_TARGET.
+
+    Args:
+        page_id (str): The ID of the page.
+        log_pages (dict, optional): The child page body returned by render_run_log_page(),
+            rendered now if not given.
+    """
+    if RUN_LOG_TARGET == "attachment":
+        get_confluence_client().attach_content(
+            generate_log_text().encode("utf-8"), RUN_LOG_ATTACHMENT, content_type="text/plain", page_id=page_id,
+        )
+    elif RUN_LOG_TARGET == "child":
+        for title, html_content in (log_pages or render_run_log_page()).items():
+            upload_table_to_confluence(html_content, find_confluence_page_id(title), title=title, parent_id=page_id)
+
+def generate_drift_html(report):
+    """
+    Generates the drift report section of the page.
+
+    Args:
+        report (dict): The report returned by build_drift_report().
+
+    Returns:
+        str: The HTML of the section, with at most DRIFT_REPORT_MAX_FLAGS flags per kind.
+    """
+    fragments = PAGE_FORMATS[PAGE_FORMAT]
+    th_open, td_open = fragments["th"], fragments["td"]
+    chunks = [
+        "<div style='margin: 20px 0;'>",
+        f"<strong>Environment drift</strong> ({escape_html(', '.join(report['environments']))}, {report['flags']} flags)",
+    ]
+    for kind, title in DRIFT_KINDS.items():
+        entries = report["drift"][kind]
+        chunks.append(f"<p>{escape_html(title)}: {len(entries)} flags</p>")
+        if not entries:
+            continue
+        chunks.append(fragments["table"])
+        chunks.append(f"<thead><tr>{th_open}Feature toggle name</th>{th_open}Environments</th></tr></thead><tbody>")
+        for entry in entries[:DRIFT_REPORT_MAX_FLAGS]:
+            if kind == "missing":
+                summary = f"only in {', '.join(entry['environments'])}; missing in {', '.join(entry['missing'])}"
+            elif kind == "enabled":
+                summary = f"enabled in {', '.join(entry['enabled'])}; disabled in {', '.join(entry['disabled'])}"
+            else:
+                summary = ", ".join(f"{environment}: {signature}" for environment, signature in entry["signatures"].items())
+            chunks.append(f"<tr>{td_open}{escape_html(entry['flag'])}</td>{td_open}{escape_html(summary)}</td></tr>")
+        chunks.append("</tbody></table>")
+        if len(entries) > DRIFT_REPORT_MAX_FLAGS:
+            chunks.append(f"<p>({len(entries) - DRIFT_REPORT_MAX_FLAGS} more)</p>")
+    chunks.append("</div>")
+    return "".join(chunks)
 
 def add_link():
     return """
@@ -516,9 +2757,9 @@ def add_link():
                 }
             }).then(response => {
                 if (response.ok) {
-                    alert('Feature flags updated successfully!');
+                    alert('Feature flags update started!');
                 } else {
-                    alert('Error updating feature flags.');
+                    alert('Error starting feature flags update.');
                 }
             });">
             Update Feature Flags
@@ -526,50 +2767,634 @@ def add_link():
     </div>
     """
 
-@app.route('/update_feature_flags', methods=['GET'])
-def update_feature_flags():
-    try:
-        add_to_log("Loading new feature flags...")
+def render_single_page(table, row_cache, drift_html=""):
+    """
+    Renders the whole table, the update button and the run log as one page body.
+
+    Args:
+        table (pd.DataFrame): The table to render.
+        row_cache (dict): Rendered rows to reuse, see generate_html_with_icons_and_dropdown().
+        drift_html (str): The drift report section shown below the table, see generate_drift_html().
+
+    Returns:
+        str: The page body.
+    """
+    add_to_log("Generating HTML code for the table with icons...")
+    with timed_stage("generate_html"):
+        html_content = generate_html_with_icons_and_dropdown(table, row_cache)
+    return add_link() + html_content + drift_html + generate_log_section()
+
+def publish_single_page(table, page_id, row_cache, drift_html=""):
+    """
+    Publishes the whole table, the update button and the run log as one Confluence page.
+
+    The page and the run log child page are rendered and checked against PAGE_SIZE_BUDGET
+    before either is uploaded.
+
+    Args:
+        table (pd.DataFrame): The table to publish.
+        page_id (str or None): The ID of the page, or None to create it.
+        row_cache (dict): Rendered rows to reuse, see generate_html_with_icons_and_dropdown().
+        drift_html (str): The drift report section shown below the table.
+    """
+    html_content = render_single_page(table, row_cache, drift_html)
+    log_pages = render_run_log_page()
+    check_page_sizes({PAGE_TITLE: html_content, **log_pages})
+    add_to_log("Uploading table to Confluence...")
+    with timed_stage("upload"):
+        page_id = upload_table_to_confluence(html_content, page_id)
+        publish_run_log(page_id, log_pages)
+
+def get_shard_key(flag_name):
+    """
+    Determines the child page a flag is published on in sharded mode.
+
+    Args:
+        flag_name (str): The name of the feature flag.
+
+    Returns:
+        str: The team of the flag (or "Unassigned") when SHARD_BY is "team",
+            otherwise the lowercased part of the name before SHARD_PREFIX_SEPARATOR.
+    """
+    if SHARD_BY == "team":
+        return get_team_from_flag_name(flag_name) or "Unassigned"
+    return flag_name.split(SHARD_PREFIX_SEPARATOR, 1)[0].lower() or "Unassigned"
+
+def get_shard_title(shard):
+    """Returns the title of the child page of a shard."""
+    return f"{PAGE_TITLE} - {shard}"
+
+def generate_shard_index_html(shard_sizes):
+    """
+    Generates the index page listing the shard child pages.
+
+    Args:
+        shard_sizes (dict): The number of flags per shard.
+
+    Returns:
+        str: The HTML of the index table.
+    """
+    fragments = PAGE_FORMATS[PAGE_FORMAT]
+    th_open, td_open = fragments["th"], fragments["td"]
+    chunks = [fragments["style"], fragments["table"], f"<thead><tr>{th_open}Page</th>{th_open}Flags</th></tr></thead><tbody>"]
+    for shard in sorted(shard_sizes):
+        title = escape_html(get_shard_title(shard), quote=True)
+        link_text = shard.replace("]]>", "]]]]><![CDATA[>")  # CDATA is not unescaped, only "]]>" must be split
+        chunks.append(
+            f'<tr>{td_open}<ac:link><ri:page ri:content-title="{title}" />'
+            f"<ac:plain-text-link-body><![CDATA[{link_text}]]></ac:plain-text-link-body></ac:link></td>"
+            f"{td_open}{shard_sizes[shard]}</td></tr>"
+        )
+    chunks.append("</tbody></table>")
+    return "".join(chunks)
+
+def get_publish_layout():
+    """
+    Returns how the table is split into pages, as recorded in the snapshot.
+
+    Returns:
+        dict: The PUBLISH_MODE ("publish_mode") and, when sharded, SHARD_BY ("shard_by").
+    """
+    return {"publish_mode": PUBLISH_MODE, "shard_by": SHARD_BY if PUBLISH_MODE == "sharded" else None}
+
+def publish_layout_changed(snapshot):
+    """
+    Checks whether the snapshot was published with another PUBLISH_MODE or SHARD_BY.
+
+    Snapshots from before the layout was recorded count as "single" page publishes.
+
+    Args:
+        snapshot (dict): The snapshot returned by load_snapshot().
+
+    Returns:
+        bool: True if every page must be published again.
+    """
+    previous = {"publish_mode": snapshot.get("publish_mode", "single"), "shard_by": snapshot.get("shard_by")}
+    return previous != get_publish_layout()
+
+def shard_pages_missing(shards):
+    """
+    Checks whether the child page of any shard cannot be found.
+
+    Args:
+        shards (iterable): The shards to look up.
+
+    Returns:
+        bool: True if a page is missing.
+    """
+    return any(find_confluence_page_id(get_shard_title(shard)) is None for shard in shards)
+
+def publish_sharded_pages(table, page_id, diff, row_cache, drift_html="", snapshot=None):
+    """
+    Publishes the table as one child page per shard below a small index page.
+
+    Shards are built with get_shard_key(). Only shards that contain an added, changed
+    or deleted flag are rendered and uploaded; the index page with the update button,
+    the drift report and the run log is uploaded on every publish. Every shard is
+    uploaded if the layout or the set of shards differs from the snapshot, or if a shard
+    page is not found. All pages are rendered and checked against PAGE_SIZE_BUDGET
+    before the first upload.
+
+    Args:
+        table (pd.DataFrame): The table to publish.
+        page_id (str or None): The ID of the index page, or None to create it.
+        diff (dict): The changes since the last publish, see diff_snapshot().
+        row_cache (dict): Rendered rows to reuse, see generate_html_with_icons_and_dropdown().
+        drift_html (str): The drift report section of the index page.
+        snapshot (dict, optional): The snapshot of the last publish, see load_snapshot().
+
+    Returns:
+        list: The published shards, sorted.
+    """
+    snapshot = snapshot or {}
+    shard_keys = table["Feature toggle name"].map(get_shard_key)
+    shard_sizes = shard_keys.value_counts().to_dict()
+    shards = sorted(shard_sizes)
+    if publish_layout_changed(snapshot) or snapshot.get("shards") != shards or shard_pages_missing(shards):
+        changed_shards = set(shards)
+    else:
+        changed_shards = {get_shard_key(name) for names in diff.values() for name in names} & set(shards)
+    add_to_log(f"Publishing {len(shards)} shards, {len(changed_shards)} changed.")
+
+    shard_pages = {}
+    with timed_stage("generate_html"):
+        for shard, shard_table in table.groupby(shard_keys, sort=True):
+            if shard in changed_shards:
+                shard_pages[get_shard_title(shard)] = generate_html_with_icons_and_dropdown(shard_table, row_cache)
+    index_html = add_link() + generate_shard_index_html(shard_sizes) + drift_html + generate_log_section()
+    log_pages = render_run_log_page()
+    check_page_sizes({PAGE_TITLE: index_html, **log_pages, **shard_pages})
+
+    with timed_stage("upload"):
+        page_id = upload_table_to_confluence(index_html, page_id)
+        publish_run_log(page_id, log_pages)
+        for title, html_content in shard_pages.items():
+            upload_table_to_confluence(html_content, find_confluence_page_id(title), title=title, parent_id=page_id)
+    return shards
+
+def remove_shard_pages(shards):
+    """
+    Moves the child pages of shards that are no longer published to the Confluence trash.
+
+    A page that cannot be removed is logged and left in place.
+
+    Args:
+        shards (iterable): The shards whose pages to remove.
+    """
+    for shard in sorted(shards):
+        title = get_shard_title(shard)
+        page_id = find_confluence_page_id(title)
+        if page_id is None:
+            continue
+        try:
+            get_confluence_client().remove_page(page_id)
+        except Exception as e:
+            add_to_log(f"Could not remove page '{title}': {e}", logging.WARNING)
+            continue
+        confluence_pages.pop(title, None)
+        add_to_log(f"Removed page '{title}', its shard is no longer published.")
+
+def fetch_and_merge_flags():
+    """
+    Fetches all flags from GitLab and merges them with the existing flags.
+
+    The existing flags come from the flag store, or from the Confluence page when the
+    store is disabled or still empty. run_sync() writes the merged table to the store
+    once it is published.
+
+    Returns:
+        tuple: The merged table (pd.DataFrame) and the Confluence page ID, or None if the page does not exist.
+    """
+    add_to_log("Loading new feature flags...")
+    with timed_stage("merge_feature_flags"):
         new_table = merge_feature_flags()
 
-        add_to_log("Checking existing table in Confluence...")
-        page_id, existing_table = fetch_existing_table_from_confluence(PAGE_TITLE)
+    existing_table = None
+    if FLAG_STORE_PATH:
+        add_to_log("Loading existing flags from the flag store...")
+        with timed_stage("fetch_existing_table"):
+            existing_table = load_flag_table_from_store()
+            if existing_table is not None:
+                page_id = find_confluence_page_id(PAGE_TITLE)
 
-        if existing_table is None:
-            add_to_log("Table not found. Creating a new one.")
-            updated_table = new_table
-        else:
-            add_to_log("Updating existing table.")
-            for _, row in existing_table.iterrows():
-                flag_name = row["Feature toggle name"]
-                if flag_name not in new_table["Feature toggle name"].values:
-                    row["Status"] = "Deleted 🔴"
-                    for repo_url, _ in REPOSITORY_MAP:
-                        if repo_url not in row:
-                            row[repo_url] = "Deleted"
-                    new_table = pd.concat([new_table, pd.DataFrame([row])], ignore_index=True)
+    if existing_table is None:
+        # Without a store, or on its first run, the table on the page is the only record
+        add_to_log("Checking existing table in Confluence...")
+        with timed_stage("fetch_existing_table"):
+            page_id, existing_table = fetch_existing_table_from_confluence(PAGE_TITLE)
 
+    if existing_table is None:
+        add_to_log("Table not found. Creating a new one.")
+        updated_table = new_table
+    else:
+        add_to_log("Updating existing table.")
+        with timed_stage("update_table"):
+            new_table = append_deleted_flags(existing_table, new_table)
             updated_table = update_table(existing_table, new_table)
+    return updated_table, page_id
 
-        add_to_log("Generating HTML code for the table...")
-        html_content = updated_table.to_html(index=False, escape=False)
+def run_sync(mode="full", dry_run=False, output=None):
+    """
+    Runs a sync of the feature flags to the Confluence page.
 
-        add_to_log("Generating HTML code for the table with icons...")
-        html_content = generate_html_with_icons_and_dropdown(updated_table)
+    Args:
+        mode (str): "full" fetches all flags from GitLab. "publish" renders the page from the
+            flag store as patched by webhooks, and falls back to a full sync if the store is empty.
+        dry_run (bool): Stop after rendering, without uploading or writing the flag store, snapshot
+            and GitLab page cache.
+        output (str, optional): A file to write the rendered page to, as published in "single" mode.
 
-        add_to_log("Uploading table to Confluence...")
-        log_html = generate_log_html()
-        html_button = add_link()
-        html_content = html_button + html_content + log_html
-        upload_table_to_confluence(html_content, page_id)
+    Returns:
+        dict: A summary of the sync with its "result" ("published", "skipped" or "dry-run"), the
+            number of added, changed and deleted flags and, once published, the body bytes of each
+            uploaded page before and after the sync ("page_bytes").
 
-        add_to_log("Operation completed successfully!")
-        return redirect('') # Replace with your Feature Flag page on confluence for redirect
+    Raises:
+        Exception: Any error that stopped the sync, after it has been logged.
+    """
+    global gitlab_cache_writable
+    start_log_run()
+    reset_interned_states()
+    page_bytes.clear()
+    increment_metric("syncs_total")
+    gitlab_cache_writable = not dry_run
+    try:
+        snapshot = load_snapshot()
+        loaded_at = time.time()  # Webhook patches stored after this are newer than the table
+        updated_table = None
+        if mode == "publish" and FLAG_STORE_PATH:
+            add_to_log("Publishing flags from the flag store...")
+            with timed_stage("fetch_existing_table"):
+                updated_table = load_flag_table_from_store()
+                if updated_table is not None:
+                    page_id = find_confluence_page_id(PAGE_TITLE)
+
+        if updated_table is None:
+            updated_table, page_id = fetch_and_merge_flags()
+        published_versions = dict(snapshot.get("page_versions", {}))
+        if FLAG_STORE_PATH and published_versions:
+            # The store is not read back from the page, so take over owners edited there
+            with timed_stage("fetch_existing_table"):
+                merge_page_owner_edits(updated_table, snapshot)
+
+        columns = list(updated_table.columns)
+        row_hashes = compute_row_hashes(updated_table)
+        diff = diff_snapshot(snapshot, columns, row_hashes)
+        add_to_log(
+            f"Changes since last publish: {len(diff['added'])} added, "
+            f"{len(diff['changed'])} changed, {len(diff['deleted'])} deleted."
+        )
+
+        # Reuse rendered HTML for rows whose content has not changed
+        stale = set(diff["added"]) | set(diff["changed"])
+        row_cache = {name: row["html"] for name, row in snapshot["rows"].items() if name in row_hashes and name not in stale}
+
+        drift_html, drift_hash = "", None
+        if DRIFT_REPORT_ON_PAGE:
+            with timed_stage("drift_report"):
+                drift_html = generate_drift_html(build_drift_report(updated_table))
+            drift_hash = hashlib.sha1(drift_html.encode("utf-8")).hexdigest()
+
+        if output:
+            html_content = render_single_page(updated_table, row_cache, drift_html)
+            with open(output, "w") as output_file:
+                output_file.write(html_content)
+            add_to_log(f"Page written to {output} ({len(html_content.encode('utf-8'))} bytes).")
+            try:
+                check_page_size(html_content)
+            except RuntimeError as e:
+                add_to_log(str(e), logging.WARNING)
+        if dry_run:
+            add_to_log("Dry run, nothing was published.")
+            return {"result": "dry-run", **{change: len(names) for change, names in diff.items()}}
+
+        if (
+            page_id and not any(diff.values()) and snapshot.get("drift") == drift_hash
+            and not publish_layout_changed(snapshot) and not shard_pages_missing(snapshot.get("shards") or [])
+        ):
+            add_to_log("No changes detected. Skipping Confluence update.")
+            increment_metric("syncs_skipped_total")
+            if FLAG_STORE_PATH and not flag_store_has_flags():
+                save_flag_table_to_store(updated_table, loaded_at)  # Seeds the store from the unchanged page
+            if snapshot.get("page_versions", {}) != published_versions:
+                # Pages were edited by hand, record their versions so they are not read again
+                save_snapshot(columns, row_hashes, row_cache, drift_hash, snapshot.get("page_bytes"),
+                              snapshot.get("shards"), snapshot["page_versions"])
+            return {"result": "skipped", **{change: len(names) for change, names in diff.items()}}
+
+        add_to_log(f"Rendering table with icons ({len(row_hashes) - len(row_cache)} rows re-rendered)...")
+
+        shards = []
+        if PUBLISH_MODE == "sharded":
+            shards = publish_sharded_pages(updated_table, page_id, diff, row_cache, drift_html, snapshot)
+        else:
+            publish_single_page(updated_table, page_id, row_cache, drift_html)
+        removed_shards = set(snapshot.get("shards") or []) - set(shards)
+        remove_shard_pages(removed_shards)
+
+        # The page shows the table now, so the store may record it
+        if FLAG_STORE_PATH:
+            save_flag_table_to_store(updated_table, loaded_at)
+
+        previous_sizes = snapshot.get("page_bytes", {})
+        for shard in removed_shards:
+            previous_sizes.pop(get_shard_title(shard), None)
+        # Only the pages that show the flag table are read back for owner edits
+        table_titles = [get_shard_title(shard) for shard in shards] if PUBLISH_MODE == "sharded" else [PAGE_TITLE]
+        known_versions = snapshot.get("page_versions", {})
+        page_versions = {}
+        for title in table_titles:
+            if title in page_bytes and title in confluence_pages:
+                version = confluence_pages[title]["version"]
+            else:
+                version = known_versions.get(title)  # Not uploaded by this sync
+            if version is not None:
+                page_versions[title] = version
+        sizes = {title: {"before": previous_sizes.get(title), "after": size} for title, size in page_bytes.items()}
+        for title, size in sizes.items():
+            add_to_log(f"Page '{title}' body: {size['before'] if size['before'] is not None else 'new'} -> {size['after']} bytes.")
+        save_snapshot(columns, row_hashes, row_cache, drift_hash, {**previous_sizes, **page_bytes}, shards, page_versions)
 
+        add_to_log("Operation completed successfully!")
+        return {"result": "published", **{change: len(names) for change, names in diff.items()}, "page_bytes": sizes}
 
     except Exception as e:
-        add_to_log(f"Error occurred: {str(e)}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        add_to_log(f"Error occurred: {str(e)}", logging.ERROR)
+        increment_metric("sync_failures_total")
+        raise
+    finally:
+        gitlab_cache_writable = True
+        flush_log()
+
+def enqueue_sync(mode="full"):
+    """
+    Queues a sync job for the background worker.
+
+    Only one sync runs at a time. A trigger that arrives while a job is already
+    waiting is merged into that job, so any number of triggers during a running
+    sync results in a single follow-up run. A full sync trigger upgrades a waiting
+    publish-only job to a full sync.
+
+    Args:
+        mode (str): The sync mode passed to run_sync(), "full" or "publish".
+
+    Returns:
+        dict: A copy of the queued job, as the worker goes on changing the job itself.
+    """
+    global pending_job_id, sync_worker_thread
+    with sync_condition:
+        if pending_job_id is not None:
+            job = sync_jobs[pending_job_id]
+            job["triggers"] += 1
+            if mode == "full":
+                job["mode"] = "full"
+            return dict(job)
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "mode": mode,
+            "status": "queued",
+            "triggers": 1,
+            "queued_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        sync_jobs[job["id"]] = job
+        while len(sync_jobs) > SYNC_JOB_HISTORY:
+            oldest_id = next(iter(sync_jobs))
+            if sync_jobs[oldest_id]["status"] in ("queued", "running"):
+                break
+            del sync_jobs[oldest_id]
+        pending_job_id = job["id"]
+
+        if sync_worker_thread is None:
+            sync_worker_thread = threading.Thread(target=sync_worker, name="sync-worker", daemon=True)
+            sync_worker_thread.start()
+        sync_condition.notify()
+        return dict(job)
+
+def sync_worker():
+    """
+    Runs queued sync jobs one at a time, forever.
+    """
+    global pending_job_id
+    while True:
+        with sync_condition:
+            while pending_job_id is None:
+                sync_condition.wait()
+            job = sync_jobs[pending_job_id]
+            pending_job_id = None
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            mode = job["mode"]
+
+        # Jobs are read by request threads, so they are only changed under sync_condition
+        try:
+            result = run_sync(mode)
+        except Exception as e:
+            update = {"status": "failed", "error": str(e)}
+        else:
+            update = {"status": "succeeded", "result": result}
+        with sync_condition:
+            job.update(update, finished_at=time.time())
+
+def get_page_url():
+    """
+    Returns the browser URL of the Confluence page.
+
+    Returns:
+        str: The page URL by ID when the ID is known, otherwise by space and title.
+    """
+    page = confluence_pages.get(PAGE_TITLE)
+    page_id = page["id"] if page else PAGE_ID
+    if page_id:
+        return f"{BASE_URL}/pages/viewpage.action?pageId={page_id}"
+    return f"{BASE_URL}/display/{quote(SPACE_KEY)}/{quote(PAGE_TITLE)}"
+
+def update_feature_flags():
+    from flask import jsonify, redirect, request
+    job = enqueue_sync()
+    if request.method == "GET" and request.accept_mimetypes.best_match(["application/json", "text/html"]) == "text/html":
+        # A browser following the link on the page goes back to it, the sync runs in the background
+        return redirect(get_page_url())
+    return jsonify({"job_id": job["id"], "status": job["status"], "triggers": job["triggers"]}), 202
+
+def sync_job_status(job_id):
+    from flask import jsonify
+    with sync_condition:
+        job = dict(sync_jobs[job_id]) if job_id in sync_jobs else None
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job)
+
+def flag_user_ids(flag_name):
+    from flask import jsonify
+    try:
+        environments = fetch_flag_user_ids(flag_name)
+    except requests.RequestException as e:
+        add_to_log(f"Error fetching user IDs of flag '{flag_name}': {e}", logging.ERROR)
+        return jsonify({"status": "error", "message": str(e)}), 502
+    if not environments:
+        return jsonify({"status": "error", "message": f"Unknown flag '{flag_name}'"}), 404
+    return jsonify({"flag": flag_name, "environments": environments})
+
+def flag_drift():
+    from flask import jsonify, request
+    kind = request.args.get("kind")
+    if kind and kind not in DRIFT_KINDS:
+        return jsonify({"status": "error", "message": f"Unknown drift kind '{kind}', expected one of {', '.join(DRIFT_KINDS)}"}), 400
+    report = get_drift_report()
+    if report is None:
+        if not FLAG_STORE_PATH:
+            return jsonify({"status": "error", "message": "Drift reports need the flag store, set FLAG_STORE_PATH"}), 503
+        # The first sync fills the store
+        job = enqueue_sync()
+        return jsonify({"status": "error", "message": "The flag store is empty, a sync was queued", "job_id": job["id"]}), 503
+    if kind:
+        report["drift"] = {kind: report["drift"][kind]}
+    return jsonify(report)
+
+def schedule_republish():
+    """
+    Schedules a publish-only sync once no webhook has arrived for WEBHOOK_DEBOUNCE_SECONDS.
+    """
+    global republish_timer
+    with republish_lock:
+        if republish_timer is not None:
+            republish_timer.cancel()
+        republish_timer = threading.Timer(WEBHOOK_DEBOUNCE_SECONDS, enqueue_sync, kwargs={"mode": "publish"})
+        republish_timer.daemon = True
+        republish_timer.start()
+
+def gitlab_webhook():
+    from flask import jsonify, request
+    if not GITLAB_WEBHOOK_SECRET:
+        return jsonify({"status": "error", "message": "Webhooks are disabled, GITLAB_WEBHOOK_SECRET is not set"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Gitlab-Token", ""), GITLAB_WEBHOOK_SECRET):
+        return jsonify({"status": "error", "message": "Invalid webhook token"}), 401
+
+    event = parse_feature_flag_event(request.get_json(silent=True) or {})
+    if event is None:
+        return jsonify({"status": "ignored", "message": "Not a feature flag event"}), 200
+    project_id, flag_name = event
+
+    environments = [repo_url for repo_url, repo_id in REPOSITORY_MAP if str(repo_id) == str(project_id)]
+    if not environments:
+        return jsonify({"status": "ignored", "message": f"Project '{project_id}' is not tracked"}), 200
+
+    if not flag_store_has_flags():
+        # Nothing to patch yet, fall back to a full sync
+        job = enqueue_sync()
+        return jsonify({"status": "queued", "job_id": job["id"]}), 202
+
+    fetched_at = time.time()
+    try:
+        flag = fetch_feature_flag(project_id, flag_name)
+    except requests.RequestException as e:
+        add_to_log(f"Error fetching flag '{flag_name}' for repository '{project_id}': {e}", logging.ERROR)
+        return jsonify({"status": "error", "message": str(e)}), 502
+
+    for environment in environments:
+        patch_flag_in_store(flag_name, environment, flag, fetched_at)
+    flush_log()
+    schedule_republish()
+    return jsonify({"status": "accepted", "flag": flag_name, "environments": environments}), 202
+
+def metrics():
+    from flask import Response
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+def create_app():
+    """
+    Creates the Flask app with the sync, webhook, user ID, drift report and metrics routes.
+
+    Returns:
+        Flask: The app.
+    """
+    from flask import Flask
+    from flask_cors import CORS
+
+    app = Flask(__name__)
+    CORS(app, resources={r"/update_feature_flags": {"origins": "https://.atlassian.net"}})
+    app.add_url_rule('/update_feature_flags', view_func=update_feature_flags, methods=['GET', 'POST'])
+    app.add_url_rule('/update_feature_flags/<job_id>', view_func=sync_job_status, methods=['GET'])
+    app.add_url_rule('/feature_flags/drift', view_func=flag_drift, methods=['GET'])
+    app.add_url_rule('/feature_flags/<path:flag_name>/user_ids', view_func=flag_user_ids, methods=['GET'])
+    app.add_url_rule('/webhooks/gitlab', view_func=gitlab_webhook, methods=['POST'])
+    app.add_url_rule('/metrics', view_func=metrics, methods=['GET'])
+    return app
+
+def get_app():
+    """Returns the Flask app of this process, creating it on first use."""
+    global flask_app
+    if flask_app is None:
+        flask_app = create_app()
+    return flask_app
+
+def __getattr__(name):
+    # Keeps `main:app` working for WSGI servers without creating the app on every import
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def check_config():
+    """
+    Lists the required settings that are still empty, and invalid settings.
+
+    Returns:
+        list: The names of the missing settings and the fixes of invalid ones, empty if
+            the configuration is complete.
+    """
+    missing = [
+        name for name in ("GITLAB_TOKEN", "GITLAB_API_URL", "CONFLUENCE_API_URL", "SPACE_KEY", "EMAIL", "CONFLUENCE_API_TOKEN")
+        if not globals()[name]
+    ]
+    missing.extend(f"the project ID of '{repo_url}' in REPOSITORY_MAP" for repo_url, repo_id in REPOSITORY_MAP if not repo_id)
+    if RENDER_PROCESSES == 1:
+        # A single worker renders no faster than the sync thread and adds the transfer of every row
+        missing.append("RENDER_PROCESSES to 0 or at least 2")
+    return missing
+
+def main_cli(argv=None):
+    """
+    Runs the Flask app, or a single sync with the "sync" command.
+
+    Args:
+        argv (list, optional): The command line arguments, sys.argv[1:] by default.
+
+    Returns:
+        int: The exit status, 1 if the sync failed and 2 if the configuration is incomplete.
+    """
+    parser = argparse.ArgumentParser(description="Syncs GitLab feature flags to a Confluence page.")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Run the Flask app (the default).")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=5000)
+    sync_parser = subparsers.add_parser("sync", help="Run a single sync and exit.")
+    sync_parser.add_argument("--mode", choices=["full", "publish"], default="full")
+    sync_parser.add_argument("--dry-run", action="store_true",
+                             help="Fetch and render only: no upload, flag store or snapshot writes.")
+    sync_parser.add_argument("--output", metavar="FILE", help="Also write the page HTML to FILE.")
+    args = parser.parse_args(argv)
+
+    missing = check_config()
+    if missing:
+        print(f"Configuration incomplete, set {', '.join(missing)} at the top of main.py.", file=sys.stderr)
+        return 2
+
+    if args.command == "sync":
+        try:
+            summary = run_sync(args.mode, dry_run=args.dry_run, output=args.output)
+        except Exception as e:
+            print(f"Sync failed: {e}", file=sys.stderr)
+            return 1
+        print(json.dumps(summary))
+        return 0
+
+    get_app().run(host=getattr(args, "host", "0.0.0.0"), port=getattr(args, "port", 5000))  # Adjust host and port as needed
+    return 0
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=5000)  # Adjust host and port as needed
+    sys.exit(main_cli())
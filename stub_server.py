@@ -0,0 +1,264 @@
+"""
+Local stub of the GitLab and Confluence APIs used by the feature flag sync.
+
+Serves N projects x M synthetic feature flags with a realistic mix of strategies, user
+lists and scopes, and keeps Confluence pages and their attachments in memory. Used by `benchmark.py pipeline`
+and for trying the sync without live services.
+
+Usage:
+    python stub_server.py [--projects 3] [--flags 1000] [--port 8080]
+
+Then point the sync at it:
+    GITLAB_API_URL = "http://127.0.0.1:8080/api/v4"
+    CONFLUENCE_API_URL = "http://127.0.0.1:8080"
+    REPOSITORY_MAP = [("prod", "1"), ("qa", "2"), ("uat", "3")]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import random
+import threading
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import make_server
+
+USER_LISTS_PER_PROJECT = 20
+ENVIRONMENT_SCOPES = ["*", "production", "staging", "review/*"]
+
+
+def make_user_ids(rng, count):
+    return ",".join(str(rng.randint(1, 10**7)) for _ in range(count))
+
+
+def make_user_list(project, index):
+    """
+    Builds a feature flag user list of a project, as returned by the GitLab API.
+    """
+    rng = random.Random(f"{project}:list:{index}")
+    return {
+        "id": int(project) * 1000 + index,
+        "iid": index,
+        "project_id": project,
+        "name": f"beta_testers_{index}",
+        "user_xids": make_user_ids(rng, rng.choice([5, 50, 500, 5000])),
+    }
+
+
+def make_strategy(rng, project, strategy_id):
+    """
+    Builds a random strategy: mostly "default", then user IDs, user lists and percentage rollouts.
+    """
+    kind = rng.random()
+    scopes = [
+        {"id": strategy_id * 10 + index, "environment_scope": environment_scope}
+        for index, environment_scope in enumerate(rng.sample(ENVIRONMENT_SCOPES, rng.randint(1, 2)))
+    ]
+    if kind < 0.4:
+        return {"id": strategy_id, "name": "default", "parameters": {}, "scopes": [{"id": strategy_id * 10, "environment_scope": "*"}]}
+    if kind < 0.65:
+        parameters = {"userIds": make_user_ids(rng, rng.choice([1, 10, 100, 1000]))}
+        return {"id": strategy_id, "name": "userWithId", "parameters": parameters, "scopes": scopes}
+    if kind < 0.8:
+        user_list = make_user_list(project, rng.randint(1, USER_LISTS_PER_PROJECT))
+        return {"id": strategy_id, "name": "gitlabUserList", "parameters": {}, "scopes": scopes, "user_list": user_list}
+    parameters = {"groupId": "default", "percentage": str(rng.choice([5, 10, 25, 50]))}
+    return {"id": strategy_id, "name": "gradualRolloutUserId", "parameters": parameters, "scopes": scopes}
+
+
+def make_flag(project, index):
+    """
+    Builds feature flag number `index` of a project, as returned by the GitLab API.
+
+    Every project has the same flag names, as environments of one application do, but
+    their state and strategies differ per project. The result only depends on its arguments.
+    """
+    area = random.Random(index).choice(["checkout", "search", "profile", "payments", "onboarding", "reports"])
+    rng = random.Random(f"{project}:{index}")
+    return {
+        "name": f"{area}_feature_{index}",
+        "description": f"Synthetic {area} flag number {index}",
+        "active": rng.random() < 0.7,
+        "version": "new_version_flag",
+        "created_at": "2024-01-01T00:00:00.000Z",
+        "updated_at": "2024-06-01T00:00:00.000Z",
+        "scopes": [],
+        "strategies": [make_strategy(rng, project, index * 10 + number) for number in range(rng.randint(1, 3))],
+    }
+
+
+def create_stub_app(projects, flags):
+    """
+    Creates the stub application.
+
+    Args:
+        projects (int): The number of GitLab projects, with IDs "1" to str(projects).
+        flags (int): The number of feature flags per project.
+
+    Returns:
+        Flask: The application.
+    """
+    app = Flask(__name__)
+    project_ids = {str(project) for project in range(1, projects + 1)}
+    pages = {}  # Confluence page ID -> page
+    failures = {}  # (project, page number) -> HTTP statuses to answer with before serving the page
+    page_ids = itertools.count(1000)
+    pages_lock = threading.Lock()
+
+    def paginate(items_count, make_item):
+        page = int(request.args.get("page", 1))
+        per_page = min(int(request.args.get("per_page", 20)), 100)
+        total_pages = max(1, -(-items_count // per_page))
+        start = (page - 1) * per_page
+        body = json.dumps([make_item(index) for index in range(start, min(start + per_page, items_count))])
+        etag = f'W/"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+        headers = {"X-Page": str(page), "X-Per-Page": str(per_page), "X-Total": str(items_count),
+                   "X-Total-Pages": str(total_pages), "X-Next-Page": str(page + 1) if page < total_pages else "",
+                   "ETag": etag}
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status=304, headers=headers)
+        return Response(body, headers=headers, mimetype="application/json")
+
+    @app.route("/api/v4/projects/<project>/feature_flags")
+    def list_feature_flags(project):
+        if project not in project_ids:
+            return jsonify({"message": "404 Project Not Found"}), 404
+        with pages_lock:
+            statuses = failures.get((project, int(request.args.get("page", 1))))
+            status = statuses.pop(0) if statuses else None
+        if status:
+            return jsonify({"message": f"{status} Stub failure"}), status
+        return paginate(flags, lambda index: make_flag(project, index))
+
+    @app.route("/api/v4/projects/<project>/feature_flags/<path:name>")
+    def get_feature_flag(project, name):
+        index = name.rsplit("_", 1)[-1]
+        if project in project_ids and index.isdigit() and int(index) < flags:
+            flag = make_flag(project, int(index))
+            if flag["name"] == name:
+                return jsonify(flag)
+        return jsonify({"message": "404 Feature Flag Not Found"}), 404
+
+    @app.route("/api/v4/projects/<project>/feature_flags_user_lists")
+    def list_user_lists(project):
+        if project not in project_ids:
+            return jsonify({"message": "404 Project Not Found"}), 404
+        return paginate(USER_LISTS_PER_PROJECT, lambda index: make_user_list(project, index + 1))
+
+    def page_json(page, expand=""):
+        result = {key: page[key] for key in ("id", "type", "title", "status", "ancestors")}
+        result["version"] = {"number": page["version"]}
+        if "body.storage" in expand:
+            result["body"] = {"storage": {"value": page["body"], "representation": "storage"}}
+        return result
+
+    @app.route("/rest/api/content", methods=["GET", "POST"])
+    @app.route("/rest/api/content/", methods=["GET", "POST"])
+    def content():
+        if request.method == "POST":
+            data = request.get_json()
+            with pages_lock:
+                page_id = str(next(page_ids))
+                pages[page_id] = {
+                    "id": page_id, "type": data.get("type", "page"), "title": data["title"], "status": "current",
+                    "space": data["space"]["key"], "ancestors": data.get("ancestors", []), "version": 1,
+                    "body": data["body"]["storage"]["value"],
+                }
+            return jsonify(page_json(pages[page_id]))
+        with pages_lock:
+            results = [
+                page_json(page, request.args.get("expand", "")) for page in pages.values()
+                if page["title"] == request.args.get("title") and page["space"] == request.args.get("spaceKey")
+            ]
+        return jsonify({"results": results, "size": len(results)})
+
+    @app.route("/rest/api/content/<page_id>", methods=["GET", "PUT", "DELETE"])
+    def content_by_id(page_id):
+        with pages_lock:
+            page = pages.get(page_id)
+            if page is None:
+                return jsonify({"message": f"No content found with id {page_id}"}), 404
+            if request.method == "DELETE":
+                del pages[page_id]  # Confluence moves it to the trash, out of reach of title lookups
+                return Response(status=204)
+            if request.method == "PUT":
+                data = request.get_json()
+                if data["version"]["number"] != page["version"] + 1:
+                    return jsonify({"message": f"Version must be incremented on update. Current version is: {page['version']}"}), 409
+                page["title"] = data.get("title", page["title"])
+                page["body"] = data["body"]["storage"]["value"]
+                page["version"] += 1
+            return jsonify(page_json(page, request.args.get("expand", "")))
+
+    @app.route("/rest/api/content/<page_id>/history")
+    def content_history(page_id):
+        with pages_lock:
+            page = pages.get(page_id)
+            if page is None:
+                return jsonify({"message": f"No content found with id {page_id}"}), 404
+            return jsonify({"latest": True, "lastUpdated": {"number": page["version"]}})
+
+    @app.route("/rest/api/content/<page_id>/child/attachment", methods=["GET", "POST"])
+    @app.route("/rest/api/content/<page_id>/child/attachment/<attachment_id>/data", methods=["POST"])
+    def attachments(page_id, attachment_id=None):
+        with pages_lock:
+            page = pages.get(page_id)
+            if page is None:
+                return jsonify({"message": f"No content found with id {page_id}"}), 404
+            files = page.setdefault("attachments", {})  # File name -> attachment
+            if request.method == "GET":
+                results = [
+                    {"id": attachment["id"], "type": "attachment", "title": name}
+                    for name, attachment in files.items() if name == request.args.get("filename", name)
+                ]
+                return jsonify({"results": results, "size": len(results)})
+            upload = request.files["file"]
+            attachment = files.get(upload.filename)
+            if attachment is None:
+                attachment = files[upload.filename] = {"id": f"att{next(page_ids)}", "version": 0}
+            attachment["data"] = upload.read()
+            attachment["version"] += 1
+            result = {"id": attachment["id"], "type": "attachment", "title": upload.filename,
+                      "version": {"number": attachment["version"]}}
+            return jsonify(result if attachment_id else {"results": [result], "size": 1})
+
+    app.config["STUB_PAGES"] = pages
+    app.config["STUB_FAILURES"] = failures
+    return app
+
+
+def start_stub_server(projects, flags, host="127.0.0.1", port=0):
+    """
+    Starts the stub server on a background thread.
+
+    Args:
+        projects (int): The number of GitLab projects.
+        flags (int): The number of feature flags per project.
+        host (str): The interface to listen on.
+        port (int): The port, 0 for a free one.
+
+    Returns:
+        tuple: The server (call shutdown() to stop it) and its base URL.
+    """
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # No line per request
+    server = make_server(host, port, create_stub_app(projects, flags), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.port}"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=3)
+    parser.add_argument("--flags", type=int, default=1000, help="Feature flags per project.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, create_stub_app(args.projects, args.flags), threaded=True)
+    print(f"Serving {args.projects} projects x {args.flags} flags on http://{args.host}:{server.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main_cli()
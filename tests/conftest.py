@@ -0,0 +1,33 @@
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep main.setup_logging() from attaching its file handler, so tests write no script.log
+logging.getLogger("feature_flags").addHandler(logging.NullHandler())
+
+import benchmark  # noqa: E402
+import main  # noqa: E402
+import stub_server  # noqa: E402
+
+
+@pytest.fixture
+def stub_app(monkeypatch, tmp_path):
+    server, base_url = stub_server.start_stub_server(2, 20)
+    for name, value in benchmark.pipeline_settings(base_url, 2, str(tmp_path)).items():
+        monkeypatch.setattr(main, name, value)
+    monkeypatch.setattr(main, "SHARD_BY", "prefix")
+    monkeypatch.setattr(main, "gitlab_session", None)
+    monkeypatch.setattr(main, "confluence_client", None)
+    main.confluence_pages.clear()
+    yield server.app
+    server.shutdown()
+    main.confluence_pages.clear()
+
+
+@pytest.fixture
+def stub(stub_app):
+    return stub_app.config["STUB_PAGES"]
@@ -0,0 +1,102 @@
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("headers, page, flags, expected", [
+    ({"X-Total-Pages": "4"}, 1, [{}], [2, 3, 4]),
+    ({"X-Total-Pages": "4"}, 3, [{}], []),  # Pages after the first were already scheduled
+    ({"X-Total-Pages": "1"}, 1, [{}], []),
+    ({"X-Next-Page": "5"}, 4, [{}], [5]),  # Large collections without X-Total-Pages
+    ({"X-Next-Page": ""}, 4, [{}], []),
+    ({}, 2, [{}], [3]),  # No pagination headers: continue until an empty page
+    ({}, 3, [], []),
+])
+def test_get_next_pages(headers, page, flags, expected):
+    assert main.get_next_pages(headers, page, flags) == expected
+
+
+def test_parse_feature_flag_event_webhook():
+    payload = {
+        "object_kind": "feature_flag",
+        "project": {"id": 42},
+        "object_attributes": {"id": 7, "name": "checkout_v2", "active": True},
+    }
+
+    assert main.parse_feature_flag_event(payload) == (42, "checkout_v2")
+
+
+@pytest.mark.parametrize("payload", [
+    {"entity_id": 42, "target_type": "Operations::FeatureFlag", "target_details": "checkout_v2"},
+    {"entity_id": 42, "details": {"target_type": "Operations::FeatureFlag", "target_details": "checkout_v2"}},
+])
+def test_parse_feature_flag_event_audit_event(payload):
+    assert main.parse_feature_flag_event(payload) == (42, "checkout_v2")
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {"object_kind": "push", "project": {"id": 42}},
+    {"object_kind": "feature_flag", "project": {"id": 42}, "object_attributes": {}},
+    {"object_kind": "feature_flag", "object_attributes": {"name": "checkout_v2"}},
+    {"entity_id": 42, "target_type": "Project", "target_details": "checkout_v2"},
+])
+def test_parse_feature_flag_event_ignores_other_payloads(payload):
+    assert main.parse_feature_flag_event(payload) is None
+
+
+def test_fetch_feature_flags_page_uses_pagination_of_not_modified_response(monkeypatch, tmp_path):
+    import stub_server
+
+    monkeypatch.setattr(main, "GITLAB_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(main, "gitlab_session", None)
+    for flags, expected_pages in [(150, "2"), (250, "3")]:  # Flags added on later pages only
+        server, base_url = stub_server.start_stub_server(1, flags)
+        try:
+            monkeypatch.setattr(main, "GITLAB_API_URL", f"{base_url}/api/v4")
+            result = main.fetch_feature_flags_page("1", 1, per_page=100)
+        finally:
+            server.shutdown()
+        assert result["headers"]["X-Total-Pages"] == expected_pages
+        assert len(result["flags"]) == 100
+
+    assert result["cached"]
+    assert main.load_cached_page("1", 1, 100)["headers"]["X-Total-Pages"] == "3"
+
+
+@pytest.mark.parametrize("secret, token, expected", [("", "", 403), ("", "guess", 403), ("s3cret", "guess", 401)])
+def test_gitlab_webhook_rejects_requests_without_valid_secret(monkeypatch, secret, token, expected):
+    monkeypatch.setattr(main, "GITLAB_WEBHOOK_SECRET", secret)
+    response = main.get_app().test_client().post(
+        "/webhooks/gitlab", json={"object_kind": "feature_flag"}, headers={"X-Gitlab-Token": token}
+    )
+
+    assert response.status_code == expected
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(main, "HTTP_MAX_RETRIES", 2)
+    monkeypatch.setattr(main, "HTTP_BACKOFF_FACTOR", 0)
+    monkeypatch.setattr(main, "HTTP_BACKOFF_JITTER", 0)
+
+
+def test_every_retry_takes_a_rate_limit_token(monkeypatch, stub_app, fast_retries):
+    hosts = []
+    monkeypatch.setattr(main, "acquire_host_token", hosts.append)
+    stub_app.config["STUB_FAILURES"][("1", 1)] = [429, 503]
+
+    response = main.get_gitlab_session().get(f"{main.GITLAB_API_URL}/projects/1/feature_flags")
+
+    assert response.status_code == 200
+    assert len(hosts) == 3 and len(set(hosts)) == 1  # First attempt and two retries, in one bucket
+
+
+def test_failed_page_fails_the_sync_instead_of_merging_a_partial_list(stub_app, fast_retries):
+    stub_app.config["STUB_FAILURES"][("2", 1)] = [503] * 3
+
+    with pytest.raises(RuntimeError):
+        main.run_sync()
+
+    assert not main.flag_store_has_flags()
+    assert stub_app.config["STUB_PAGES"] == {}
@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def repository_map(monkeypatch):
+    monkeypatch.setattr(main, "REPOSITORY_MAP", [("prod", "1"), ("qa", "2")])
+
+
+def make_table(names, status="In Use 🟢", **columns):
+    return pd.DataFrame({
+        "Feature toggle name": names,
+        "Feature description": [f"{name} description" for name in names],
+        "Owned by": ["Team"] * len(names),
+        "Status": [status] * len(names),
+        **columns,
+    })
+
+
+def test_append_deleted_flags_marks_missing_flags():
+    enabled = main.get_environment_state("Enabled", {"scopes": [], "strategies": [], "user_list": None})
+    existing = make_table(["a", "gone"], prod=[enabled, enabled])
+    new = make_table(["a", "new"], prod=[enabled, enabled])
+
+    result = main.append_deleted_flags(existing, new)
+
+    assert list(result["Feature toggle name"]) == ["a", "new", "gone"]
+    deleted = result.iloc[2]
+    assert deleted["Status"] == "Deleted 🔴"
+    assert deleted["Feature description"] == "gone description"
+    assert (deleted["prod"].status, deleted["prod"].details) == ("Deleted", enabled.details)  # History of the flag is kept
+    assert deleted["qa"] == "Deleted"  # Environments without a column are added as deleted
+
+
+def test_append_deleted_flags_without_deletions_returns_new_table():
+    existing = make_table(["a"])
+    new = make_table(["a", "b"])
+
+    assert main.append_deleted_flags(existing, new) is new
+
+
+def test_append_deleted_flags_keeps_already_deleted_flags_once():
+    existing = make_table(["a", "gone"], status="Deleted 🔴")
+    new = make_table(["a"])
+
+    result = main.append_deleted_flags(existing, new)
+
+    assert list(result["Feature toggle name"]) == ["a", "gone"]
+
+
+def test_update_table_drops_environments_missing_from_the_new_table():
+    enabled = main.get_environment_state("Enabled", {"scopes": [], "strategies": [], "user_list": None})
+    existing = make_table(["x", "y"], prod=[enabled, enabled], qa=[enabled, enabled])
+    new = make_table(["x"], prod=[enabled])
+
+    result = main.update_table(existing, new).set_index("Feature toggle name")
+
+    assert result.loc["x", "prod"] is enabled
+    assert pd.isna(result.loc["x", "qa"])  # Gone from qa, rendered as "Not Available"
+    assert result.loc["y", "qa"] is enabled  # Not in the new table, kept as it was
+
+
+def test_drift_report_lists_a_flag_removed_from_one_environment():
+    enabled = main.get_environment_state("Enabled", {"scopes": [], "strategies": [], "user_list": None})
+    existing = make_table(["x", "gone"], prod=[enabled, enabled], qa=[enabled, enabled])
+    new = make_table(["x"], prod=[enabled])
+
+    table = main.update_table(existing, main.append_deleted_flags(existing, new))
+    report = main.build_drift_report(table)
+
+    assert report["drift"] == {
+        "missing": [{"flag": "x", "environments": ["prod"], "missing": ["qa"]}],
+        "enabled": [],
+        "strategy": [],
+    }
+
+
+@pytest.fixture
+def teams(monkeypatch):
+    monkeypatch.setattr(main, "TEAMS", ["Payments", "Search", "Checkout"])
+    monkeypatch.setattr(main, "TEAM_ALIASES", {"Payments": ["billing"], "Checkout": ["cart"]})
+    monkeypatch.setattr(main, "TEAM_PREFIXES", {"Search": ["s_"], "Checkout": ["s_cart"]})
+    main.reset_team_index()
+    yield
+    main.reset_team_index()
+
+
+@pytest.mark.parametrize("flag_name, team", [
+    ("new-payments-flow", "Payments"),
+    ("NEW-BILLING-PAGE", "Payments"),  # Alias, case-insensitive
+    ("cart-badge", "Checkout"),
+    ("search-payments-widget", "Payments"),  # Several teams: the first listed in TEAMS wins
+    ("cart-billing-sync", "Payments"),  # ... also when found through aliases
+    ("s_cart_v2", "Checkout"),  # No word matches (words split on non-word characters): longest prefix
+    ("s_index_v2", "Search"),
+    ("s_cart-search", "Search"),  # Words match before prefixes
+    ("billingual-copy", None),  # Whole words only
+    ("unrelated", None),
+])
+def test_get_team_from_flag_name(teams, flag_name, team):
+    assert main.get_team_from_flag_name(flag_name) == team
+
+
+def test_team_prefixes_are_sorted_longest_first(teams):
+    assert main.build_team_index()["prefixes"] == [("s_cart", "Checkout"), ("s_", "Search")]
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+import main
+
+ROLLOUT_DETAILS = {
+    "scopes": [{"id": 1, "environment_scope": "production"}],
+    "strategies": [
+        {"id": 7, "name": "flexibleRollout", "parameters": {"groupId": "beta"},
+         "scopes": [{"id": 8, "environment_scope": "review/*"}]},
+    ],
+    "user_list": None,
+}
+DEFAULT_DETAILS = {
+    "scopes": [],
+    "strategies": [{"id": 9, "name": "default", "parameters": {}, "scopes": [{"id": 10, "environment_scope": "*"}]}],
+    "user_list": None,
+}
+
+
+def make_table():
+    return pd.DataFrame({
+        "Feature toggle name": ["checkout_v2", "search <beta> & more"],
+        "Feature description": ["New checkout", "Uses \"quotes\""],
+        "Owned by": ["Payments", ""],
+        "Status": ["In Use 🟢", "Inactive ⚪"],
+        "prod": [main.get_environment_state("Enabled", ROLLOUT_DETAILS), main.get_environment_state("Disabled", DEFAULT_DETAILS)],
+        "qa": [main.get_environment_state("Disabled", ROLLOUT_DETAILS), float("nan")],
+    })
+
+
+@pytest.mark.parametrize("page_format", ["inline", "compact"])
+def test_parse_feature_flag_table_round_trip(monkeypatch, page_format):
+    monkeypatch.setattr(main, "PAGE_FORMAT", page_format)
+    table = make_table()
+    page = main.add_link() + main.generate_html_with_icons_and_dropdown(table) + main.generate_log_html()
+
+    parsed = main.parse_feature_flag_table(page)
+
+    assert list(parsed.columns) == list(table.columns)
+    assert parsed[main.BASE_COLUMNS].to_dict("records") == table[main.BASE_COLUMNS].to_dict("records")
+    rollout, disabled = parsed.loc[0, "prod"], parsed.loc[1, "prod"]
+    assert (rollout.status, rollout.details) == ("Enabled", ROLLOUT_DETAILS)
+    assert parsed.loc[0, "qa"].status == "Disabled"
+    # Cells without a dropdown keep only their status
+    assert (disabled.status, disabled.details) == ("Disabled", {})
+    assert parsed.loc[1, "qa"].status == "Not Available"
+
+
+def test_parse_feature_flag_table_formats_agree(monkeypatch):
+    pages = {}
+    for page_format in ["inline", "compact"]:
+        monkeypatch.setattr(main, "PAGE_FORMAT", page_format)
+        pages[page_format] = main.generate_html_with_icons_and_dropdown(make_table())
+
+    assert len(pages["compact"]) < len(pages["inline"])
+    inline, compact = (main.parse_feature_flag_table(page) for page in pages.values())
+    assert main.compute_row_hashes(inline) == main.compute_row_hashes(compact)
+
+
+def test_parse_feature_flag_table_without_table():
+    assert main.parse_feature_flag_table("<p>No table yet</p>") is None
+
+
+@pytest.mark.parametrize("page_format", ["inline", "compact"])
+def test_parse_details_markup_nested(monkeypatch, page_format):
+    monkeypatch.setattr(main, "PAGE_FORMAT", page_format)
+    details = {"a": [[1, [2, "x y"]], {"b": {"c": [None, True]}}], "d": {"e": {"f": -3}}}
+
+    assert main.parse_details_markup(main.format_details(details)) == details
+
+
+
+@pytest.mark.parametrize("page_format", ["inline", "compact"])
+def test_render_details_dropdown_shares_shape_across_ids(monkeypatch, page_format):
+    monkeypatch.setattr(main, "PAGE_FORMAT", page_format)
+    main.details_cache.clear()
+    other_ids = {**ROLLOUT_DETAILS, "scopes": [{"id": 101, "environment_scope": "production"}]}
+    first, second = (main.get_environment_state("Enabled", details) for details in (ROLLOUT_DETAILS, other_ids))
+
+    assert first.shape is second.shape
+    assert second.details == other_ids
+    dropdowns = [main.render_details_dropdown(cell.shape, cell.ids, cell.key) for cell in (first, second)]
+
+    assert len(main.details_cache) == 1
+    assert dropdowns == [
+        main.PAGE_FORMATS[page_format]["dropdown"] + main.format_details(details) + main.DROPDOWN_CLOSE
+        for details in (ROLLOUT_DETAILS, other_ids)
+    ]
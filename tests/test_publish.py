@@ -0,0 +1,149 @@
+import json
+import re
+
+import pytest
+
+import main
+
+
+def page_titles(pages):
+    return sorted(page["title"] for page in pages.values())
+
+
+def test_switching_publish_mode_republishes_every_page(monkeypatch, stub):
+    shard_titles = [f"{main.PAGE_TITLE} - {area}" for area in ["checkout", "onboarding", "payments", "profile", "reports", "search"]]
+    assert main.run_sync()["result"] == "published"
+    assert page_titles(stub) == [main.PAGE_TITLE]
+
+    # Nothing changed in GitLab, but the shard pages do not exist yet
+    monkeypatch.setattr(main, "PUBLISH_MODE", "sharded")
+    assert main.run_sync(mode="publish")["result"] == "published"
+    assert page_titles(stub) == sorted([main.PAGE_TITLE, *shard_titles])
+    assert main.load_snapshot()["shards"] == ["checkout", "onboarding", "payments", "profile", "reports", "search"]
+
+    # A shard page deleted by hand is published again
+    del stub[main.find_confluence_page_id(shard_titles[0])]
+    main.confluence_pages.clear()
+    assert main.run_sync(mode="publish")["result"] == "published"
+    assert page_titles(stub) == sorted([main.PAGE_TITLE, *shard_titles])
+
+    # Shard pages that are no longer published are removed
+    monkeypatch.setattr(main, "PUBLISH_MODE", "single")
+    assert main.run_sync(mode="publish")["result"] == "published"
+    assert page_titles(stub) == [main.PAGE_TITLE]
+    assert main.load_snapshot()["shards"] == []
+
+
+def test_upload_drops_cached_id_of_a_missing_page(stub):
+    page_id = main.upload_table_to_confluence("<p>v1</p>", title="Flags - checkout")
+    del stub[page_id]
+    main.confluence_pages["Flags - checkout"]["version"] = None  # Looked up again before the update
+
+    with pytest.raises(main.requests.HTTPError):
+        main.upload_table_to_confluence("<p>v2</p>", main.find_confluence_page_id("Flags - checkout"), title="Flags - checkout")
+
+    assert "Flags - checkout" not in main.confluence_pages
+    assert main.find_confluence_page_id("Flags - checkout") is None
+
+
+def test_page_updates_are_not_retried():
+    retry = main.create_http_session(1).get_adapter("https://").max_retries
+    assert "GET" in retry.allowed_methods
+    assert "PUT" not in retry.allowed_methods
+
+
+def test_dry_run_leaves_on_disk_state_unchanged(stub, tmp_path):
+    summary = main.run_sync(dry_run=True, output=str(tmp_path / "page.html"))
+
+    assert summary["result"] == "dry-run"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["page.html"]
+    assert stub == {}
+
+
+def test_failed_publish_leaves_the_flag_store_empty(monkeypatch, stub):
+    def fail(*args, **kwargs):
+        raise main.requests.HTTPError("503 Service Unavailable")
+
+    monkeypatch.setattr(main, "upload_table_to_confluence", fail)
+    with pytest.raises(main.requests.HTTPError):
+        main.run_sync()
+
+    assert not main.flag_store_has_flags()
+
+
+def test_owner_edited_on_the_page_is_kept(monkeypatch, stub):
+    monkeypatch.setattr(main, "PAGE_FORMAT", "compact")
+    assert main.run_sync()["result"] == "published"
+    page = stub[main.find_confluence_page_id(main.PAGE_TITLE)]
+    page["body"], edits = re.subn(r"(<td>checkout_feature_\d+</td><td>[^<]*</td><td>)[^<]*", r"\1Jane Doe", page["body"], count=1)
+    page["version"] += 1
+    assert edits == 1
+
+    assert main.run_sync()["result"] == "published"
+    assert "Jane Doe" in main.load_flag_table_from_store()["Owned by"].tolist()
+
+    # Later syncs keep the owner instead of deriving it from GitLab again
+    assert main.run_sync()["result"] == "skipped"
+    assert "Jane Doe" in main.load_flag_table_from_store()["Owned by"].tolist()
+    assert "<td>Jane Doe</td>" in page["body"]
+
+
+def test_sharded_index_page_is_not_read_for_owners(monkeypatch, stub):
+    monkeypatch.setattr(main, "PUBLISH_MODE", "sharded")
+    assert main.run_sync()["result"] == "published"
+    snapshot = main.load_snapshot()
+    assert main.PAGE_TITLE not in snapshot["page_versions"]
+    assert len(snapshot["page_versions"]) == len(snapshot["shards"])
+
+    # Snapshots written before the fix recorded the index page too
+    index = stub[main.find_confluence_page_id(main.PAGE_TITLE)]
+    snapshot["page_versions"][main.PAGE_TITLE] = index["version"] - 1
+    with open(main.SNAPSHOT_PATH, "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+
+    assert main.run_sync()["result"] == "skipped"
+
+
+def test_skipped_sync_records_pages_edited_by_hand(monkeypatch, stub):
+    assert main.run_sync()["result"] == "published"
+    page = stub[main.find_confluence_page_id(main.PAGE_TITLE)]
+    page["version"] += 1  # Edited by hand, but not an owner
+
+    assert main.run_sync()["result"] == "skipped"
+    assert main.load_snapshot()["page_versions"] == {main.PAGE_TITLE: page["version"]}
+
+    monkeypatch.setattr(main, "fetch_existing_table_from_confluence", lambda title: pytest.fail("The page was read again"))
+    assert main.run_sync()["result"] == "skipped"
+
+
+def test_page_over_the_size_budget_fails_before_any_upload(monkeypatch, stub):
+    monkeypatch.setattr(main, "PUBLISH_MODE", "sharded")
+    monkeypatch.setattr(main, "RUN_LOG_TARGET", "child")
+    monkeypatch.setattr(main, "PAGE_SIZE_BUDGET", 35000)  # The index fits, the "search" shard does not
+
+    with pytest.raises(RuntimeError, match="Feature Flags - search"):
+        main.run_sync()
+
+    assert stub == {}
+
+
+def test_shard_index_links_keep_names_as_they_are():
+    index = main.generate_shard_index_html({"R&D": 2, 'x]]>"y"': 1})
+
+    assert "<![CDATA[R&D]]>" in index
+    assert '<ri:page ri:content-title="Feature Flags - R&amp;D" />' in index
+    assert "<![CDATA[x]]]]><![CDATA[>\"y\"]]>" in index
+    assert '<ri:page ri:content-title="Feature Flags - x]]&gt;&quot;y&quot;" />' in index
+
+
+def test_uploaded_bytes_count_each_stored_body_once(stub):
+    body = "<p>v1</p>"
+    uploaded_before = main.metric_counters["bytes_uploaded_total"]
+    page_id = main.upload_table_to_confluence(body, title="Flags - checkout")
+    stub[page_id]["version"] += 1  # Edited by hand, the first PUT conflicts and is retried
+    main.upload_table_to_confluence(body, page_id, title="Flags - checkout")
+    del stub[page_id]
+    with pytest.raises(main.requests.HTTPError):
+        main.upload_table_to_confluence(body, page_id, title="Flags - checkout")
+
+    assert main.metric_counters["bytes_uploaded_total"] - uploaded_before == 2 * len(body)
@@ -0,0 +1,31 @@
+import pytest
+
+import benchmark
+import main
+
+
+@pytest.fixture
+def render_pool(monkeypatch):
+    monkeypatch.setattr(main, "RENDER_PROCESSES", 2)
+    monkeypatch.setattr(main, "RENDER_PROCESSES_MIN_ROWS", 0)
+    yield
+    if main.render_pool is not None:
+        main.render_pool.shutdown()
+    monkeypatch.setattr(main, "render_pool", None)
+
+
+def test_render_pool_uses_the_settings_of_the_app(monkeypatch, render_pool):
+    table = benchmark.make_table(50, shapes=5)
+    for page_format, preview in [("compact", 2), ("inline", 10)]:  # Changed at runtime, after the pool started
+        monkeypatch.setattr(main, "PAGE_FORMAT", page_format)
+        monkeypatch.setattr(main, "USER_IDS_PREVIEW", preview)
+        parallel = main.generate_html_with_icons_and_dropdown(table)
+
+        monkeypatch.setattr(main, "RENDER_PROCESSES", 0)
+        assert parallel == main.generate_html_with_icons_and_dropdown(table)
+        monkeypatch.setattr(main, "RENDER_PROCESSES", 2)
+
+
+def test_check_config_rejects_a_single_render_process(monkeypatch):
+    monkeypatch.setattr(main, "RENDER_PROCESSES", 1)
+    assert "RENDER_PROCESSES to 0 or at least 2" in main.check_config()
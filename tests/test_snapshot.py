@@ -0,0 +1,55 @@
+import pandas as pd
+
+import main
+
+
+def make_snapshot(columns, hashes):
+    return {"columns": columns, "rows": {name: {"hash": row_hash, "html": "<tr></tr>"} for name, row_hash in hashes.items()}}
+
+
+def test_diff_snapshot_lists_added_changed_and_deleted():
+    snapshot = make_snapshot(["Feature toggle name", "prod"], {"a": "1", "b": "2", "c": "3"})
+
+    diff = main.diff_snapshot(snapshot, ["Feature toggle name", "prod"], {"a": "1", "b": "changed", "d": "4"})
+
+    assert diff == {"added": ["d"], "changed": ["b"], "deleted": ["c"]}
+
+
+def test_diff_snapshot_unchanged():
+    snapshot = make_snapshot(["Feature toggle name", "prod"], {"a": "1"})
+
+    diff = main.diff_snapshot(snapshot, ["Feature toggle name", "prod"], {"a": "1"})
+
+    assert not any(diff.values())
+
+
+def test_diff_snapshot_column_change_marks_every_row():
+    snapshot = make_snapshot(["Feature toggle name", "prod"], {"a": "1", "b": "2"})
+
+    diff = main.diff_snapshot(snapshot, ["Feature toggle name", "prod", "qa"], {"a": "1", "b": "2"})
+
+    assert diff == {"added": [], "changed": ["a", "b"], "deleted": []}
+
+
+def test_diff_snapshot_format_change_marks_every_row(monkeypatch):
+    snapshot = make_snapshot(["Feature toggle name"], {"a": "1"})
+    monkeypatch.setattr(main, "PAGE_FORMAT", "compact")
+
+    assert main.diff_snapshot(snapshot, ["Feature toggle name"], {"a": "1"})["changed"] == ["a"]
+
+
+def test_diff_snapshot_empty_snapshot():
+    diff = main.diff_snapshot({"columns": [], "rows": {}}, ["Feature toggle name"], {"a": "1"})
+
+    assert diff == {"added": ["a"], "changed": [], "deleted": []}
+
+
+def test_compute_row_hashes_follow_content():
+    state = main.get_environment_state("Enabled", {"scopes": [], "strategies": [], "user_list": None})
+    table = pd.DataFrame({"Feature toggle name": ["a", "b"], "Status": ["x", "x"], "prod": [state, float("nan")]})
+    changed = table.assign(Status=["x", "y"])
+
+    before, after = main.compute_row_hashes(table), main.compute_row_hashes(changed)
+
+    assert before["a"] == after["a"]
+    assert before["b"] != after["b"]
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+import main
+
+DETAILS = {"scopes": [], "strategies": [], "user_list": None}
+
+
+@pytest.fixture(autouse=True)
+def flag_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "FLAG_STORE_PATH", str(tmp_path / "feature_flags.db"))
+    monkeypatch.setattr(main, "REPOSITORY_MAP", [("prod", "1")])
+
+
+def make_table(status):
+    return pd.DataFrame({
+        "Feature toggle name": ["checkout"],
+        "Feature description": ["New checkout"],
+        "Owned by": ["Payments"],
+        "Status": ["In Use 🟢" if status == "Enabled" else "Inactive ⚪"],
+        "prod": [main.get_environment_state(status, DETAILS)],
+    })
+
+
+def make_flag(active):
+    return {"name": "checkout", "description": "New checkout", "active": active, "scopes": [], "strategies": []}
+
+
+def stored_state():
+    table = main.load_flag_table_from_store()
+    return table.loc[0, "Status"], table.loc[0, "prod"].status
+
+
+def test_sync_keeps_flags_patched_after_its_fetch():
+    main.save_flag_table_to_store(make_table("Disabled"), fetched_at=100)
+    main.patch_flag_in_store("checkout", "prod", make_flag(True), fetched_at=200)
+
+    # A full sync that fetched before the webhook finishes after it
+    main.save_flag_table_to_store(make_table("Disabled"), fetched_at=150)
+
+    assert stored_state() == ("In Use 🟢", "Enabled")
+
+
+def test_patch_older_than_sync_is_skipped():
+    main.save_flag_table_to_store(make_table("Enabled"), fetched_at=200)
+    main.patch_flag_in_store("checkout", "prod", make_flag(False), fetched_at=150)
+
+    assert stored_state() == ("In Use 🟢", "Enabled")
+
+
+def test_environment_missing_from_the_table_is_marked_deleted():
+    table = make_table("Enabled").assign(qa=[main.get_environment_state("Enabled", DETAILS)])
+    main.save_flag_table_to_store(table, fetched_at=100)
+    main.save_flag_table_to_store(table.assign(qa=[float("nan")]), fetched_at=200)
+
+    stored = main.load_flag_table_from_store()
+    assert (stored.loc[0, "prod"].status, stored.loc[0, "qa"].status) == ("Enabled", "Deleted")
+    assert stored.loc[0, "qa"].details == DETAILS
+
+
+def test_flag_drift_reads_the_store_and_queues_a_sync_when_empty(monkeypatch):
+    queued = []
+    monkeypatch.setattr(main, "enqueue_sync", lambda mode="full": queued.append(mode) or {"id": "job"})
+    monkeypatch.setattr(main, "merge_feature_flags", lambda: pytest.fail("The request must not fetch from GitLab"))
+    client = main.get_app().test_client()
+
+    response = client.get("/feature_flags/drift")
+    assert (response.status_code, response.get_json()["job_id"], queued) == (503, "job", ["full"])
+
+    main.save_flag_table_to_store(make_table("Enabled"))
+    response = client.get("/feature_flags/drift")
+    assert response.status_code == 200
+    assert response.get_json()["flags"] == 1
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8", 302),  # Browser
+    ("*/*", 202),
+    ("application/json", 202),
+])
+def test_update_feature_flags_redirects_browsers_to_the_page(monkeypatch, accept, expected):
+    monkeypatch.setattr(main, "enqueue_sync", lambda mode="full": {"id": "job", "status": "queued", "triggers": 1})
+    monkeypatch.setattr(main, "PAGE_ID", "1234")
+    monkeypatch.setattr(main, "BASE_URL", "https://example.atlassian.net/wiki")
+    response = main.get_app().test_client().get("/update_feature_flags", headers={"Accept": accept})
+
+    assert response.status_code == expected
+    if expected == 302:
+        assert response.headers["Location"] == "https://example.atlassian.net/wiki/pages/viewpage.action?pageId=1234"
+    else:
+        assert response.get_json()["job_id"] == "job"
@@ -0,0 +1,42 @@
+import threading
+import time
+from collections import OrderedDict
+
+import main
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "Timed out"
+        time.sleep(0.01)
+
+
+def test_triggers_during_a_running_sync_queue_one_follow_up(monkeypatch):
+    monkeypatch.setattr(main, "sync_jobs", OrderedDict())
+    monkeypatch.setattr(main, "sync_condition", threading.Condition())
+    monkeypatch.setattr(main, "pending_job_id", None)
+    monkeypatch.setattr(main, "sync_worker_thread", None)
+    started, release = threading.Event(), threading.Event()
+    modes = []
+
+    def run_sync(mode):
+        modes.append(mode)
+        started.set()
+        release.wait(5)
+        return {"result": "published"}
+
+    monkeypatch.setattr(main, "run_sync", run_sync)
+    first = main.enqueue_sync("publish")
+    assert started.wait(5)
+
+    # While the first job runs, every trigger is merged into one waiting job
+    follow_ups = [main.enqueue_sync(mode) for mode in ["publish", "full", "publish"]]
+    assert len({job["id"] for job in follow_ups} | {first["id"]}) == 2
+    assert [job["mode"] for job in follow_ups] == ["publish", "full", "full"]  # Upgraded by the full trigger
+    release.set()
+
+    follow_up = main.sync_jobs[follow_ups[0]["id"]]
+    wait_for(lambda: follow_up["status"] == "succeeded")
+    assert modes == ["publish", "full"]
+    assert (follow_up["triggers"], len(main.sync_jobs)) == (3, 2)